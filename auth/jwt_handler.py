@@ -1,10 +1,17 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from jose import jwt, JWTError
+import hashlib
 import os
+import time
 from dotenv import load_dotenv
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from bson import ObjectId
+from database import user_collection
+from models.user import Principal
+from utils.cache import TTLCache
+from utils.metrics import register_metrics
 
 load_dotenv()
 
@@ -25,7 +32,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
+# Clients present the same token on every request and socket message. Keep
+# successfully verified payloads, keyed by a digest of the token, until the
+# token's own expiry so repeat presentations skip decoding and the HMAC check.
+token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", 4096)),
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+register_metrics("token_cache", token_cache.stats)
+
+def _decode_token(token: str) -> Optional[Dict[str, Any]]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -35,6 +51,21 @@ def verify_token(token: str) -> Optional[Dict[str, Any]]:
     except JWTError:
         return None
 
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
+
+    payload = _decode_token(token)
+    if payload is None:
+        return None
+
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        token_cache.set(key, payload, ttl=exp - time.time())
+    return dict(payload)
+
 def get_current_user_email(token: str) -> Optional[str]:
     payload = verify_token(token)
     if payload is None:
@@ -59,6 +90,44 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         )
     return email
 
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def user_token_claims(user: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Claims identifying a user document, so that requests can be authorised
+    without loading the user again
+    """
+    return {"sub": user["email"], "uid": str(user["_id"]), "username": user.get("username")}
+
+async def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    payload = verify_token(credentials.credentials)
+    if payload is None:
+        raise _credentials_exception()
+
+    if payload.get("uid"):
+        return Principal(id=payload["uid"], email=payload["sub"], username=payload.get("username"))
+
+    # Tokens issued before the uid claim existed only carry the email.
+    user = await user_collection.find_one({"email": payload["sub"]}, {"_id": 1, "email": 1, "username": 1})
+    if not user:
+        raise _credentials_exception()
+    return Principal(id=str(user["_id"]), email=user["email"], username=user.get("username"))
+
+async def get_current_user_doc(principal: Principal = Depends(get_current_principal)) -> Dict[str, Any]:
+    """
+    Opt-in dependency for handlers that need the full user document; FastAPI
+    resolves it at most once per request
+    """
+    user = await user_collection.find_one({"_id": ObjectId(principal.id)})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
 def create_refresh_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=7)  # 7 days
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+AI planner throughput benchmark: sends concurrent plan requests with distinct
+destinations (so neither the plan cache nor request coalescing can help) and
+reports throughput, latency and the scheduler counters.
+
+Start the API with the local stub backend, then run the benchmark:
+
+    LLM_PROVIDER=stub LLM_STUB_LATENCY_MS=300 LLM_STUB_TOKENS_PER_SEC=200 uvicorn main:app
+    python bench_ai_plan.py --base-url http://localhost:8000 --days 14
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import httpx
+
+async def _plan_worker(client: httpx.AsyncClient, path: str, days: int, deadline: float, results: list):
+    while time.perf_counter() < deadline:
+        request = {
+            "destination": f"Bench City {uuid.uuid4().hex[:8]}",
+            "duration_days": days,
+            "interests": ["food", "history"],
+        }
+        started = time.perf_counter()
+        response = await client.post(path, json=request)
+        results.append((response.status_code, time.perf_counter() - started))
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def run_benchmark(base_url: str, concurrency: int, duration: float, days: int, stream: bool):
+    path = "/ai/plan-trip/stream" if stream else "/ai/plan-trip"
+
+    print(f"🧪 AI planner benchmark ({concurrency} concurrent {days}-day plans on {path} for {duration:.0f}s)")
+    print("=" * 50)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        results = []
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[_plan_worker(client, path, days, deadline, results) for _ in range(concurrency)])
+        metrics = (await client.get("/metrics")).json().get("ai_scheduler", {})
+
+    ok = [latency for code, latency in results if code == 200]
+    errors = {}
+    for code, _ in results:
+        if code != 200:
+            errors[code] = errors.get(code, 0) + 1
+    print(f"Plans: {len(ok)} ok, errors {errors or 'none'}, {len(ok) / duration:.2f} plans/s")
+    if ok:
+        print(f"Latency: median {statistics.median(ok) * 1000:.0f} ms, p99 {_percentile(ok, 0.99) * 1000:.0f} ms")
+    print(
+        f"Scheduler: {metrics.get('calls')} upstream calls, {metrics.get('rejected_queue_full')} rejected (queue full), "
+        f"avg queue wait {metrics.get('queue_wait_seconds', {}).get('avg')} s"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="use the Server-Sent Events endpoint")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.base_url, args.concurrency, args.duration, args.days, args.stream))
+
+if __name__ == "__main__":
+    main()
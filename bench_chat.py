@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Chat send benchmark: runs concurrent senders in one event loop (one worker)
+through the previous persistence path (user lookup, insert, re-read) and
+through deliver_message in each CHAT_BROADCAST_MODE and with the
+write-behind buffer, and reports messages per second. Uses the database configured by MONGO_DETAILS and removes the
+documents it creates.
+
+    python bench_chat.py --concurrency 32 --duration 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from database import chat_collection, user_collection
+from services.chat_service import build_message, chat_write_buffer, serialize_message
+from services.socket_manager import deliver_message, sio
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def _previous_send(trip_id: str, user_id: str, text: str):
+    """The send path before this change: three round trips, then broadcast"""
+    from bson import ObjectId
+    from datetime import datetime
+
+    user = await user_collection.find_one({"_id": ObjectId(user_id)})
+    result = await chat_collection.insert_one({
+        "trip_id": trip_id,
+        "user_id": user_id,
+        "username": user.get("username", "Unknown"),
+        "message": text,
+        "timestamp": datetime.utcnow()
+    })
+    inserted = await chat_collection.find_one({"_id": result.inserted_id})
+    await sio.emit("receive_message", serialize_message(inserted), room=trip_id)
+
+async def _run(label: str, send, concurrency: int, duration: float):
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def sender():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await send()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*[sender() for _ in range(concurrency)])
+    print(
+        f"{label}: {len(latencies) / duration:.0f} messages/s, "
+        f"median {statistics.median(latencies):.2f} ms, p99 {_percentile(latencies, 0.99):.2f} ms"
+    )
+
+async def run_benchmark(concurrency: int, duration: float):
+    suffix = uuid.uuid4().hex[:8]
+    trip_id = f"bench_trip_{suffix}"
+    user = await user_collection.insert_one({"username": f"bench_{suffix}", "email": f"bench_{suffix}@example.com"})
+    user_id = str(user.inserted_id)
+
+    print(f"🧪 Chat send benchmark ({concurrency} concurrent senders, {duration:.0f}s per mode, one worker)")
+    print("=" * 50)
+
+    try:
+        await _run("Previous path", lambda: _previous_send(trip_id, user_id, "hello"), concurrency, duration)
+        async def send_buffered():
+            message_doc, message = build_message(trip_id, user_id, f"bench_{suffix}", "hello")
+            await deliver_message(message_doc, message, trip_id, mode="after_ack")
+
+        for mode in ("after_ack", "before_ack", "parallel"):
+            async def send(mode=mode):
+                message_doc, message = build_message(trip_id, user_id, f"bench_{suffix}", "hello")
+                await deliver_message(message_doc, message, trip_id, mode=mode)
+            await _run(mode, send, concurrency, duration)
+
+        await chat_write_buffer.start()
+        await _run("after_ack, write-behind", send_buffered, concurrency, duration)
+        await chat_write_buffer.stop()
+        batches = chat_write_buffer.stats()["batch_size"]
+        print(f"  {batches['count']} batches, {batches['avg']:.1f} messages per batch")
+    finally:
+        await chat_collection.delete_many({"trip_id": trip_id})
+        await user_collection.delete_one({"_id": user.inserted_id})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.concurrency, args.duration))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the authentication dependency with and without the
+verified-token cache. Runs offline: tokens carry the uid claim, so
+get_current_principal never touches the database.
+"""
+
+import argparse
+import asyncio
+import time
+from fastapi.security import HTTPAuthorizationCredentials
+from auth import jwt_handler
+from utils.cache import TTLCache
+
+async def _time_dependency(token: str, iterations: int) -> float:
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await jwt_handler.get_current_principal(credentials)
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+async def run_benchmark(iterations: int):
+    token = jwt_handler.create_access_token(
+        data={"sub": "bench@example.com", "uid": "0123456789abcdef01234567", "username": "bench"}
+    )
+
+    print(f"🧪 Auth dependency microbenchmark ({iterations} iterations)")
+    print("=" * 50)
+
+    cached = jwt_handler.token_cache
+    jwt_handler.token_cache = TTLCache(maxsize=0, ttl=0)
+    try:
+        uncached_us = await _time_dependency(token, iterations)
+    finally:
+        jwt_handler.token_cache = cached
+
+    cached_us = await _time_dependency(token, iterations)
+
+    print(f"Without cache: {uncached_us:8.2f} µs/request")
+    print(f"With cache:    {cached_us:8.2f} µs/request")
+    print(f"Speed-up:      {uncached_us / cached_us:8.1f}x")
+    print(f"Cache stats:   {jwt_handler.token_cache.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.iterations))
+
+if __name__ == "__main__":
+    main()
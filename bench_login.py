@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark: runs concurrent logins against a running server
+while another task keeps hitting a cheap endpoint, and reports how much the
+password hashing work delays the unrelated requests.
+
+Start the API first (uvicorn main:app), then:
+
+    python bench_login.py --base-url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import httpx
+
+async def _login_worker(client: httpx.AsyncClient, credentials: dict, deadline: float, results: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post("/auth/login", json=credentials)
+        results.append((response.status_code, time.perf_counter() - started))
+
+async def _probe_worker(client: httpx.AsyncClient, deadline: float, latencies: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await client.get("/")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def run_benchmark(base_url: str, concurrency: int, duration: float):
+    suffix = uuid.uuid4().hex[:8]
+    credentials = {"email": f"bench_{suffix}@example.com", "password": "benchmark-password"}
+
+    print(f"🧪 Login benchmark ({concurrency} concurrent logins for {duration:.0f}s)")
+    print("=" * 50)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        response = await client.post("/auth/register", json={"username": f"bench_{suffix}", **credentials})
+        if response.status_code != 200:
+            print(f"❌ Could not register benchmark user: {response.status_code} {response.text}")
+            return
+
+        login_results = []
+        probe_latencies = []
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            _probe_worker(client, deadline, probe_latencies),
+            *[_login_worker(client, credentials, deadline, login_results) for _ in range(concurrency)]
+        )
+
+        metrics = (await client.get("/metrics")).json().get("password_hashing", {})
+
+    ok = [latency for code, latency in login_results if code == 200]
+    rejected = sum(1 for code, _ in login_results if code == 503)
+    print(f"Logins: {len(ok)} ok, {rejected} rejected (503), {len(ok) / duration:.1f} logins/s")
+    if ok:
+        print(f"Login latency: median {statistics.median(ok) * 1000:.1f} ms, p99 {_percentile(ok, 0.99) * 1000:.1f} ms")
+    if probe_latencies:
+        print(
+            f"Other endpoint latency: median {statistics.median(probe_latencies):.1f} ms, "
+            f"p99 {_percentile(probe_latencies, 0.99):.1f} ms, max {max(probe_latencies):.1f} ms"
+        )
+    print(f"Password hash pool: {metrics}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.base_url, args.concurrency, args.duration))
+
+if __name__ == "__main__":
+    main()
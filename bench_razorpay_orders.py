@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Order creation benchmark: creates Razorpay orders concurrently against the
+local stand-in (razorpay_standin.py, started in-process) with the synchronous
+SDK and with the async gateway, and reports throughput and how long the
+event loop was blocked.
+
+    python bench_razorpay_orders.py --latency-ms 80 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+def _start_standin(port: int, latency_ms: float):
+    os.environ["RAZORPAY_STANDIN_LATENCY_MS"] = str(latency_ms)
+    import uvicorn
+    import razorpay_standin
+
+    server = uvicorn.Server(uvicorn.Config(razorpay_standin.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+def _order_data(i: int) -> dict:
+    return {"amount": 250000, "currency": "INR", "receipt": f"bench_{i}", "notes": {"tripId": "bench"}}
+
+async def _loop_lag_probe(deadline: float, lags: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - started - 0.01) * 1000)
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def _run(label: str, create_order, concurrency: int, duration: float):
+    latencies, lags, errors = [], [], []
+    deadline = time.perf_counter() + duration
+
+    async def worker(w: int):
+        i = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await create_order(_order_data(w * 1_000_000 + i))
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors.append(e)
+            i += 1
+
+    await asyncio.gather(_loop_lag_probe(deadline, lags), *[worker(w) for w in range(concurrency)])
+
+    print(f"{label}: {len(latencies) / duration:.1f} orders/s, {len(errors)} errors")
+    if latencies:
+        print(f"  order latency: median {statistics.median(latencies):.1f} ms, p99 {_percentile(latencies, 0.99):.1f} ms")
+    if lags:
+        print(f"  event loop lag: p99 {_percentile(lags, 0.99):.1f} ms, max {max(lags):.1f} ms")
+
+async def run_benchmark(port: int, concurrency: int, duration: float):
+    import razorpay
+    from services.razorpay_gateway import RazorpayGateway
+
+    base_url = f"http://127.0.0.1:{port}"
+    sdk = razorpay.Client(auth=("rzp_test_bench", "bench_secret"), base_url=base_url)
+    gateway = RazorpayGateway("rzp_test_bench", "bench_secret", base_url=base_url)
+
+    async def sdk_create(data):
+        return sdk.order.create(data=data)
+
+    await _run("Synchronous SDK", sdk_create, concurrency, duration)
+    await _run("Async gateway", gateway.create_order, concurrency, duration)
+    await gateway.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"🧪 Razorpay order benchmark ({args.concurrency} concurrent, {args.latency_ms:.0f} ms API latency, {args.duration:.0f}s each)")
+    print("=" * 50)
+
+    server, thread = _start_standin(args.port, args.latency_ms)
+    try:
+        asyncio.run(run_benchmark(args.port, args.concurrency, args.duration))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+if __name__ == "__main__":
+    main()
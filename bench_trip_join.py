@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for trip joins: fires many simultaneous joins at a
+capacity-limited trip and checks that it is never overbooked.
+
+Requires a running MongoDB at MONGO_DETAILS. All data created here is removed
+at the end of the run.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from fastapi import HTTPException
+from database import trip_collection, user_collection
+from controllers import trip_controller
+
+async def run_benchmark(joins: int, capacity: int):
+    run_id = uuid.uuid4().hex[:8]
+    emails = [f"bench_{run_id}_{i}@example.com" for i in range(joins)]
+
+    print(f"🧪 Trip join benchmark ({joins} concurrent joins, capacity {capacity})")
+    print("=" * 50)
+
+    inserted = await user_collection.insert_many([
+        {"email": email, "username": f"bench_{run_id}_{i}", "created_at": datetime.utcnow(), "is_active": True}
+        for i, email in enumerate(emails)
+    ])
+    # Trips record members by user id
+    user_ids = [str(user_id) for user_id in inserted.inserted_ids]
+    trip = await trip_collection.insert_one({
+        "title": f"Benchmark trip {run_id}",
+        "destination": "Benchmark",
+        "duration_days": 1,
+        "price": 0,
+        "host_id": "benchmark-host",
+        "joined_users": [],
+        "max_participants": capacity,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+        "is_active": True,
+        "status": "upcoming",
+    })
+    trip_id = str(trip.inserted_id)
+
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *[trip_controller.join_trip_by_id(trip_id, user_id) for user_id in user_ids],
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - started
+
+        joined = sum(1 for r in results if isinstance(r, dict))
+        rejections = {}
+        for r in results:
+            if isinstance(r, HTTPException):
+                rejections[r.detail] = rejections.get(r.detail, 0) + 1
+            elif isinstance(r, Exception):
+                rejections[repr(r)] = rejections.get(repr(r), 0) + 1
+
+        stored = await trip_collection.find_one({"_id": trip.inserted_id}, {"joined_users": 1})
+        members = len(stored.get("joined_users", []))
+
+        print(f"Elapsed: {elapsed:.3f}s ({joins / elapsed:.0f} joins/s)")
+        print(f"Successful joins: {joined}")
+        print(f"Rejections: {rejections}")
+        print(f"Members stored: {members}")
+
+        if members > capacity or members != joined:
+            print("❌ Trip was overbooked or membership is inconsistent")
+            return False
+        print("✅ No overbooking")
+        return True
+    finally:
+        await trip_collection.delete_one({"_id": trip.inserted_id})
+        await user_collection.delete_many({"_id": {"$in": inserted.inserted_ids}})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--joins", type=int, default=1000)
+    parser.add_argument("--capacity", type=int, default=50)
+    args = parser.parse_args()
+    ok = asyncio.run(run_benchmark(args.joins, args.capacity))
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare payload size and latency of the full and summary trip list views.
+
+Seeds trips with long itineraries and large groups, then times
+get_all_trips(view="full") against get_all_trips(view="summary").
+Requires a running MongoDB at MONGO_DETAILS. Seeded trips are removed at the end.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from database import trip_collection
+from controllers import trip_controller
+
+def _seed_trip(run_id: str, index: int, days: int, members: int) -> dict:
+    return {
+        "title": f"Benchmark trip {index}",
+        "destination": f"Bench-{run_id}",
+        "duration_days": days,
+        "price": 1000.0 + index,
+        "description": "A benchmark trip with a long itinerary and a large group.",
+        "itinerary": [
+            {
+                "day": day,
+                "description": f"Day {day}: guided walk, local lunch and an evening activity " * 3,
+                "location": f"Stop {day}",
+                "time": "09:00",
+                "cost": 25.0,
+            }
+            for day in range(1, days + 1)
+        ],
+        "max_participants": members + 10,
+        "category": "Cultural",
+        "difficulty_level": "Easy",
+        "image_url": "https://images.unsplash.com/photo-benchmark",
+        "host_id": "benchmark-host",
+        "joined_users": [str(uuid.uuid4().hex[:24]) for _ in range(members)],
+        "created_at": datetime.utcnow() - timedelta(seconds=index),
+        "updated_at": datetime.utcnow(),
+        "is_active": True,
+        "status": "upcoming",
+        "bench_run": run_id,
+    }
+
+async def _measure(view: str, limit: int, rounds: int):
+    timings = []
+    payload = b""
+    for _ in range(rounds):
+        started = time.perf_counter()
+        page = await trip_controller.get_all_trips(limit=limit, view=view)
+        payload = json.dumps(jsonable_encoder(page.items)).encode()
+        timings.append((time.perf_counter() - started) * 1000)
+    return payload, timings
+
+async def run_benchmark(trips: int, days: int, members: int, rounds: int):
+    run_id = uuid.uuid4().hex[:8]
+    print(f"🧪 Trip list view benchmark ({trips} trips, {days}-day itineraries, {members} members)")
+    print("=" * 50)
+
+    await trip_collection.insert_many([_seed_trip(run_id, i, days, members) for i in range(trips)])
+    try:
+        for view in ("full", "summary"):
+            payload, timings = await _measure(view, trips, rounds)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+            print(
+                f"{view:>8}: {len(payload) / 1024:8.1f} KiB, "
+                f"median {statistics.median(timings):7.2f} ms, p95 {p95:7.2f} ms"
+            )
+    finally:
+        await trip_collection.delete_many({"bench_run": run_id})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trips", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.trips, args.days, args.members, args.rounds))
+
+if __name__ == "__main__":
+    main()
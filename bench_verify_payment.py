@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Payment verification write benchmark: marks seeded payments and orders paid
+with the previous two independent updates, in one transaction (replica set
+or sharded cluster only) and with the outbox marker, and reports the latency
+distribution of each. Uses the database configured by MONGO_DETAILS and
+removes the documents it creates.
+
+    python bench_verify_payment.py --count 2000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime
+from services.payment_settlement import PaymentSettlement
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def _seed(settlement: PaymentSettlement, prefix: str, count: int) -> list:
+    order_ids = [f"{prefix}_{i}" for i in range(count)]
+    now = datetime.utcnow()
+    await settlement.orders_collection.insert_many(
+        [{"order_id": order_id, "status": "created", "created_at": now} for order_id in order_ids]
+    )
+    await settlement.payments_collection.insert_many(
+        [{"order_id": order_id, "trip_id": "bench", "user_id": "bench", "status": "pending", "created_at": now} for order_id in order_ids]
+    )
+    return order_ids
+
+async def _two_writes(settlement: PaymentSettlement, payment_filter: dict, payment_set: dict, order_id: str) -> bool:
+    """The verify path before settlement: two independent round trips"""
+    result = await settlement.payments_collection.update_one(payment_filter, {"$set": payment_set})
+    if result.modified_count == 0:
+        return False
+    await settlement.orders_collection.update_one(
+        {"order_id": order_id},
+        {"$set": {"status": "paid", "updated_at": datetime.utcnow()}}
+    )
+    return True
+
+async def _run(label: str, mark_paid, settlement: PaymentSettlement, count: int, concurrency: int):
+    prefix = f"order_bench_{uuid.uuid4().hex[:8]}"
+    order_ids = await _seed(settlement, prefix, count)
+    pending = iter(order_ids)
+    latencies = []
+
+    async def worker():
+        for order_id in pending:
+            payment_filter = {"order_id": order_id, "trip_id": "bench", "user_id": "bench"}
+            payment_set = {"status": "success", "razorpay_payment_id": f"pay_{order_id}", "updated_at": datetime.utcnow()}
+            started = time.perf_counter()
+            await mark_paid(payment_filter, payment_set, order_id)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    paid = await settlement.orders_collection.count_documents({"order_id": {"$regex": f"^{prefix}_"}, "status": "paid"})
+    print(f"{label}: {len(latencies) / elapsed:.0f} verifies/s, {paid}/{count} orders paid")
+    print(
+        f"  latency: median {statistics.median(latencies):.2f} ms, "
+        f"p99 {_percentile(latencies, 0.99):.2f} ms, max {max(latencies):.2f} ms"
+    )
+
+    await settlement.payments_collection.delete_many({"order_id": {"$regex": f"^{prefix}_"}})
+    await settlement.orders_collection.delete_many({"order_id": {"$regex": f"^{prefix}_"}})
+
+async def run_benchmark(count: int, concurrency: int):
+    settlement = PaymentSettlement()
+    transactions = await settlement._supports_transactions()
+
+    print(f"🧪 Payment verification benchmark ({count} verifies, {concurrency} concurrent)")
+    print("=" * 50)
+
+    await _run("Two writes (previous)", lambda *args: _two_writes(settlement, *args), settlement, count, concurrency)
+    if transactions:
+        await _run("Transaction", settlement.mark_paid, settlement, count, concurrency)
+    else:
+        print("Transaction: skipped, the deployment is not a replica set")
+    settlement._transactions = False
+    await _run("Outbox", settlement.mark_paid, settlement, count, concurrency)
+    await settlement.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.count, args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ RAZORPAY_CONFIG = {
     "KEY_ID": os.getenv('RAZORPAY_KEY_ID', 'rzp_test_0ZPYiHpjj69JAD'),
     "KEY_SECRET": os.getenv('RAZORPAY_KEY_SECRET', 'vjVn6mgfh9jO0dxIDGE8YX5E'),
     
+    # Secret configured for the webhook endpoint in the Razorpay dashboard
+    "WEBHOOK_SECRET": os.getenv('RAZORPAY_WEBHOOK_SECRET', ''),
+    
     # Production keys - Uncomment when going live
     # "KEY_ID": os.getenv('RAZORPAY_LIVE_KEY_ID', 'rzp_live_YOUR_LIVE_KEY_ID'),
     # "KEY_SECRET": os.getenv('RAZORPAY_LIVE_KEY_SECRET', 'YOUR_LIVE_KEY_SECRET'),
@@ -4,8 +4,8 @@
 from fastapi import HTTPException, status
 from database import user_collection
 from models.user import UserCreate, UserLogin, UserResponse, UserUpdate
-from auth.password_handler import get_password_hash, verify_password
-from auth.jwt_handler import create_access_token
+from auth.password_handler import get_password_hash_async, verify_password_async
+from auth.jwt_handler import create_access_token, user_token_claims
 from bson import ObjectId
 from datetime import datetime
 
@@ -20,7 +20,7 @@ async def register_user(user_data: UserCreate):
     if existing_username:
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = {
         "username": user_data.username,
         "email": user_data.email,
@@ -46,7 +46,7 @@ async def register_user(user_data: UserCreate):
         profile_picture=created_user.get("profile_picture")
     )
     
-    access_token = create_access_token(data={"sub": user_data.email})
+    access_token = create_access_token(data=user_token_claims(created_user))
     return {
         "access_token": access_token, 
         "token_type": "bearer",
@@ -63,7 +63,7 @@ async def login_user(user_data: UserLogin):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(user_data.password, user["hashed_password"]):
+    if not await verify_password_async(user_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -93,7 +93,7 @@ async def login_user(user_data: UserLogin):
         profile_picture=user.get("profile_picture")
     )
     
-    access_token = create_access_token(data={"sub": user["email"]})
+    access_token = create_access_token(data=user_token_claims(user))
     return {"access_token": access_token, "token_type": "bearer", "user": user_response}
 
 async def get_user_profile(user_email: str):
@@ -159,10 +159,10 @@ async def change_password(user_email: str, current_password: str, new_password:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not verify_password(current_password, user["hashed_password"]):
+    if not await verify_password_async(current_password, user["hashed_password"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
-    hashed_new_password = get_password_hash(new_password)
+    hashed_new_password = await get_password_hash_async(new_password)
     await user_collection.update_one(
         {"email": user_email},
         {"$set": {"hashed_password": hashed_new_password, "updated_at": datetime.utcnow()}}
@@ -1,9 +1,121 @@
 from bson import ObjectId
 from fastapi import HTTPException
 from database import trip_collection, user_collection
-from models.trip import TripCreate, TripInDB, TripResponse, TripUpdate, TripSearch
+from models.trip import TripCreate, TripInDB, TripResponse, TripSummary, TripUpdate, TripSearch, TripPage
 from datetime import datetime
 from typing import List, Optional
+from utils.pagination import keyset_filter, merge_filters, next_cursor_for
+from utils.cache import TTLCache
+from utils.metrics import register_metrics
+import os
+
+# Trip pages are read far more often than written. Entries are invalidated
+# explicitly on every write in this module; the TTL bounds staleness for
+# writes made by other worker processes.
+trip_cache = TTLCache(
+    maxsize=int(os.getenv("TRIP_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("TRIP_CACHE_TTL_SECONDS", 30))
+)
+register_metrics("trip_cache", trip_cache.stats)
+
+def _to_trip_response(trip: dict) -> TripResponse:
+    return TripResponse(
+        id=str(trip["_id"]),
+        title=trip["title"],
+        destination=trip["destination"],
+        duration_days=trip["duration_days"],
+        price=trip["price"],
+        description=trip.get("description"),
+        itinerary=trip.get("itinerary", []),
+        max_participants=trip.get("max_participants"),
+        start_date=trip.get("start_date"),
+        end_date=trip.get("end_date"),
+        category=trip.get("category"),
+        difficulty_level=trip.get("difficulty_level"),
+        image_url=trip.get("image_url"),
+        host_id=trip["host_id"],
+        joined_users=trip.get("joined_users", []),
+        created_at=trip["created_at"],
+        status=trip["status"],
+        current_participants=len(trip.get("joined_users", []))
+    )
+
+# List views only render cards: leave the itinerary and member list on the
+# server and let Mongo compute the participant count.
+SUMMARY_PROJECTION = {
+    "title": 1,
+    "destination": 1,
+    "duration_days": 1,
+    "price": 1,
+    "description": 1,
+    "max_participants": 1,
+    "start_date": 1,
+    "end_date": 1,
+    "category": 1,
+    "difficulty_level": 1,
+    "image_url": 1,
+    "host_id": 1,
+    "created_at": 1,
+    "status": 1,
+    "current_participants": {"$size": {"$ifNull": ["$joined_users", []]}},
+}
+
+def _to_trip_summary(trip: dict) -> TripSummary:
+    return TripSummary(
+        id=str(trip["_id"]),
+        title=trip["title"],
+        destination=trip["destination"],
+        duration_days=trip["duration_days"],
+        price=trip["price"],
+        description=trip.get("description"),
+        max_participants=trip.get("max_participants"),
+        start_date=trip.get("start_date"),
+        end_date=trip.get("end_date"),
+        category=trip.get("category"),
+        difficulty_level=trip.get("difficulty_level"),
+        image_url=trip.get("image_url"),
+        host_id=trip["host_id"],
+        created_at=trip["created_at"],
+        status=trip["status"],
+        current_participants=trip.get("current_participants", 0)
+    )
+
+def _view_options(view: str):
+    if view == "summary":
+        return SUMMARY_PROJECTION, _to_trip_summary
+    if view == "full":
+        return None, _to_trip_response
+    raise HTTPException(status_code=400, detail="Invalid view")
+
+async def _list_trips(
+    query: dict,
+    limit: int,
+    skip: int = 0,
+    cursor: Optional[str] = None,
+    view: str = "full"
+) -> TripPage:
+    # Keyset pagination on (created_at, _id): a cursor seeks straight to the
+    # page boundary via the index, so page N costs the same as page 1.
+    # skip is only honoured for clients that have not moved to cursors yet.
+    if cursor:
+        try:
+            query = merge_filters(query, keyset_filter("created_at", cursor))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        skip = 0
+
+    projection, build = _view_options(view)
+    docs = []
+    find_cursor = trip_collection.find(query, projection).sort([("created_at", -1), ("_id", -1)])
+    if skip:
+        find_cursor = find_cursor.skip(skip)
+    async for trip in find_cursor.limit(limit + 1):
+        docs.append(trip)
+
+    return TripPage(
+        items=[build(trip) for trip in docs[:limit]],
+        next_cursor=next_cursor_for(docs, limit, "created_at")
+    )
 
 async def create_new_trip(trip_data: TripCreate):
     host = await user_collection.find_one({"_id": ObjectId(trip_data.host_id)})
@@ -19,84 +131,25 @@ async def create_new_trip(trip_data: TripCreate):
     new_trip = await trip_collection.insert_one(trip_dict)
     created_trip = await trip_collection.find_one({"_id": new_trip.inserted_id})
 
-    return TripResponse(
-        id=str(created_trip["_id"]),
-        title=created_trip["title"],
-        destination=created_trip["destination"],
-        duration_days=created_trip["duration_days"],
-        price=created_trip["price"],
-        description=created_trip.get("description"),
-        itinerary=created_trip.get("itinerary", []),
-        max_participants=created_trip.get("max_participants"),
-        start_date=created_trip.get("start_date"),
-        end_date=created_trip.get("end_date"),
-        category=created_trip.get("category"),
-        difficulty_level=created_trip.get("difficulty_level"),
-        image_url=created_trip.get("image_url"),
-        host_id=created_trip["host_id"],
-        joined_users=created_trip.get("joined_users", []),
-        created_at=created_trip["created_at"],
-        status=created_trip["status"],
-        current_participants=len(created_trip.get("joined_users", []))
-    )
+    return _to_trip_response(created_trip)
 
-async def get_all_trips(limit: int = 50, skip: int = 0):
-    trips = []
-    cursor = trip_collection.find({"is_active": True}).skip(skip).limit(limit).sort("created_at", -1)
-
-    async for trip in cursor:
-        trips.append(TripResponse(
-            id=str(trip["_id"]),
-            title=trip["title"],
-            destination=trip["destination"],
-            duration_days=trip["duration_days"],
-            price=trip["price"],
-            description=trip.get("description"),
-            itinerary=trip.get("itinerary", []),
-            max_participants=trip.get("max_participants"),
-            start_date=trip.get("start_date"),
-            end_date=trip.get("end_date"),
-            category=trip.get("category"),
-            difficulty_level=trip.get("difficulty_level"),
-            image_url=trip.get("image_url"),
-            host_id=trip["host_id"],
-            joined_users=trip.get("joined_users", []),
-            created_at=trip["created_at"],
-            status=trip["status"],
-            current_participants=len(trip.get("joined_users", []))
-        ))
-    return trips
+async def get_all_trips(limit: int = 50, skip: int = 0, cursor: Optional[str] = None, view: str = "full"):
+    return await _list_trips({"is_active": True}, limit, skip=skip, cursor=cursor, view=view)
 
 async def get_trip_by_id(trip_id: str):
     if not ObjectId.is_valid(trip_id):
         raise HTTPException(status_code=400, detail="Invalid trip ID")
 
+    return await trip_cache.get_or_load(trip_id, lambda: _load_trip(trip_id))
+
+async def _load_trip(trip_id: str) -> TripResponse:
     trip = await trip_collection.find_one({"_id": ObjectId(trip_id), "is_active": True})
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
 
-    return TripResponse(
-        id=str(trip["_id"]),
-        title=trip["title"],
-        destination=trip["destination"],
-        duration_days=trip["duration_days"],
-        price=trip["price"],
-        description=trip.get("description"),
-        itinerary=trip.get("itinerary", []),
-        max_participants=trip.get("max_participants"),
-        start_date=trip.get("start_date"),
-        end_date=trip.get("end_date"),
-        category=trip.get("category"),
-        difficulty_level=trip.get("difficulty_level"),
-        image_url=trip.get("image_url"),
-        host_id=trip["host_id"],
-        joined_users=trip.get("joined_users", []),
-        created_at=trip["created_at"],
-        status=trip["status"],
-        current_participants=len(trip.get("joined_users", []))
-    )
+    return _to_trip_response(trip)
 
-async def update_trip(trip_id: str, trip_update: TripUpdate, user_email: str):
+async def update_trip(trip_id: str, trip_update: TripUpdate, user_id: str):
     if not ObjectId.is_valid(trip_id):
         raise HTTPException(status_code=400, detail="Invalid trip ID")
 
@@ -104,8 +157,7 @@ async def update_trip(trip_id: str, trip_update: TripUpdate, user_email: str):
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
 
-    host = await user_collection.find_one({"email": user_email})
-    if not host or str(host["_id"]) != trip["host_id"]:
+    if trip["host_id"] != user_id:
         raise HTTPException(status_code=403, detail="Only the trip host can update the trip")
 
     update_data = {"updated_at": datetime.utcnow()}
@@ -117,32 +169,14 @@ async def update_trip(trip_id: str, trip_update: TripUpdate, user_email: str):
         {"$set": update_data}
     )
 
+    trip_cache.invalidate(trip_id)
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="No changes made")
 
     updated_trip = await trip_collection.find_one({"_id": ObjectId(trip_id)})
-    return TripResponse(
-        id=str(updated_trip["_id"]),
-        title=updated_trip["title"],
-        destination=updated_trip["destination"],
-        duration_days=updated_trip["duration_days"],
-        price=updated_trip["price"],
-        description=updated_trip.get("description"),
-        itinerary=updated_trip.get("itinerary", []),
-        max_participants=updated_trip.get("max_participants"),
-        start_date=updated_trip.get("start_date"),
-        end_date=updated_trip.get("end_date"),
-        category=updated_trip.get("category"),
-        difficulty_level=updated_trip.get("difficulty_level"),
-        image_url=updated_trip.get("image_url"),
-        host_id=updated_trip["host_id"],
-        joined_users=updated_trip.get("joined_users", []),
-        created_at=updated_trip["created_at"],
-        status=updated_trip["status"],
-        current_participants=len(updated_trip.get("joined_users", []))
-    )
+    return _to_trip_response(updated_trip)
 
-async def delete_trip(trip_id: str, user_email: str):
+async def delete_trip(trip_id: str, user_id: str):
     if not ObjectId.is_valid(trip_id):
         raise HTTPException(status_code=400, detail="Invalid trip ID")
 
@@ -150,8 +184,7 @@ async def delete_trip(trip_id: str, user_email: str):
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
 
-    host = await user_collection.find_one({"email": user_email})
-    if not host or str(host["_id"]) != trip["host_id"]:
+    if trip["host_id"] != user_id:
         raise HTTPException(status_code=403, detail="Only the trip host can delete the trip")
 
     result = await trip_collection.update_one(
@@ -159,70 +192,93 @@ async def delete_trip(trip_id: str, user_email: str):
         {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
     )
 
+    trip_cache.invalidate(trip_id)
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="Could not delete trip")
 
     return {"message": "Trip deleted successfully"}
 
-async def join_trip_by_id(trip_id: str, user_email: str):
-    if not ObjectId.is_valid(trip_id):
-        raise HTTPException(status_code=400, detail="Invalid trip ID")
-
-    user = await user_collection.find_one({"email": user_email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    trip = await trip_collection.find_one({"_id": ObjectId(trip_id), "is_active": True})
+def _participant_count_expr():
+    return {"$size": {"$ifNull": ["$joined_users", []]}}
+
+async def _explain_membership_failure(trip_id: str, user_id: str, joining: bool):
+    # Only reached when the conditional update matched nothing, so the happy
+    # path stays a single round trip. One projected read tells us which
+    # predicate failed without shipping the member list back.
+    trip = await trip_collection.find_one(
+        {"_id": ObjectId(trip_id), "is_active": True},
+        {
+            "host_id": 1,
+            "max_participants": 1,
+            "is_member": {"$in": [user_id, {"$ifNull": ["$joined_users", []]}]},
+            "participants": _participant_count_expr(),
+        }
+    )
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
 
-    if str(user["_id"]) == trip["host_id"]:
-        raise HTTPException(status_code=400, detail="Host cannot join their own trip")
+    if not joining:
+        if not trip.get("is_member"):
+            raise HTTPException(status_code=400, detail="You are not a member of this trip")
+        raise HTTPException(status_code=400, detail="Could not leave trip")
 
-    if str(user["_id"]) in trip.get("joined_users", []):
+    if trip["host_id"] == user_id:
+        raise HTTPException(status_code=400, detail="Host cannot join their own trip")
+    if trip.get("is_member"):
         raise HTTPException(status_code=400, detail="You are already a member of this trip")
-
     max_participants = trip.get("max_participants")
-    current_participants = len(trip.get("joined_users", []))
-    if max_participants and current_participants >= max_participants:
+    if max_participants and trip.get("participants", 0) >= max_participants:
         raise HTTPException(status_code=400, detail="Trip is full")
+    raise HTTPException(status_code=400, detail="Could not join trip")
+
+async def join_trip_by_id(trip_id: str, user_id: str):
+    if not ObjectId.is_valid(trip_id):
+        raise HTTPException(status_code=400, detail="Invalid trip ID")
 
+    # Host exclusion, membership and capacity are all evaluated by the server
+    # inside the update filter, so concurrent joins cannot overbook the trip.
     update_result = await trip_collection.update_one(
-        {"_id": ObjectId(trip_id)},
-        {"$addToSet": {"joined_users": str(user["_id"])}}
+        {
+            "_id": ObjectId(trip_id),
+            "is_active": True,
+            "host_id": {"$ne": user_id},
+            "joined_users": {"$ne": user_id},
+            "$or": [
+                {"max_participants": None},
+                {"$expr": {"$lt": [_participant_count_expr(), "$max_participants"]}},
+            ],
+        },
+        {"$addToSet": {"joined_users": user_id}}
     )
 
     if update_result.modified_count == 0:
-        raise HTTPException(status_code=400, detail="Could not join trip")
+        await _explain_membership_failure(trip_id, user_id, joining=True)
+    trip_cache.invalidate(trip_id)
 
     return {"message": "Successfully joined the trip"}
 
-async def leave_trip(trip_id: str, user_email: str):
+async def leave_trip(trip_id: str, user_id: str):
     if not ObjectId.is_valid(trip_id):
         raise HTTPException(status_code=400, detail="Invalid trip ID")
 
-    user = await user_collection.find_one({"email": user_email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    trip = await trip_collection.find_one({"_id": ObjectId(trip_id), "is_active": True})
-    if not trip:
-        raise HTTPException(status_code=404, detail="Trip not found")
-
-    if str(user["_id"]) not in trip.get("joined_users", []):
-        raise HTTPException(status_code=400, detail="You are not a member of this trip")
-
     update_result = await trip_collection.update_one(
-        {"_id": ObjectId(trip_id)},
-        {"$pull": {"joined_users": str(user["_id"])}}
+        {"_id": ObjectId(trip_id), "is_active": True, "joined_users": user_id},
+        {"$pull": {"joined_users": user_id}}
     )
 
     if update_result.modified_count == 0:
-        raise HTTPException(status_code=400, detail="Could not leave trip")
+        await _explain_membership_failure(trip_id, user_id, joining=False)
+    trip_cache.invalidate(trip_id)
 
     return {"message": "Successfully left the trip"}
 
-async def search_trips(search_params: TripSearch, limit: int = 50, skip: int = 0):
+async def search_trips(
+    search_params: TripSearch,
+    limit: int = 50,
+    skip: int = 0,
+    cursor: Optional[str] = None,
+    view: str = "full"
+):
     query = {"is_active": True}
 
     if search_params.destination:
@@ -256,39 +312,9 @@ async def search_trips(search_params: TripSearch, limit: int = 50, skip: int = 0
     if search_params.end_date:
         query["end_date"] = {"$lte": search_params.end_date}
 
-    trips = []
-    cursor = trip_collection.find(query).skip(skip).limit(limit).sort("created_at", -1)
+    return await _list_trips(query, limit, skip=skip, cursor=cursor, view=view)
 
-    async for trip in cursor:
-        trips.append(TripResponse(
-            id=str(trip["_id"]),
-            title=trip["title"],
-            destination=trip["destination"],
-            duration_days=trip["duration_days"],
-            price=trip["price"],
-            description=trip.get("description"),
-            itinerary=trip.get("itinerary", []),
-            max_participants=trip.get("max_participants"),
-            start_date=trip.get("start_date"),
-            end_date=trip.get("end_date"),
-            category=trip.get("category"),
-            difficulty_level=trip.get("difficulty_level"),
-            image_url=trip.get("image_url"),
-            host_id=trip["host_id"],
-            joined_users=trip.get("joined_users", []),
-            created_at=trip["created_at"],
-            status=trip["status"],
-            current_participants=len(trip.get("joined_users", []))
-        ))
-
-    return trips
-
-async def get_user_trips(user_email: str, trip_type: str = "all"):
-    user = await user_collection.find_one({"email": user_email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user_id = str(user["_id"])
+async def get_user_trips(user_id: str, trip_type: str = "all", view: str = "full"):
     query = {"is_active": True}
 
     if trip_type == "hosted":
@@ -300,29 +326,11 @@ async def get_user_trips(user_email: str, trip_type: str = "all"):
     else:
         raise HTTPException(status_code=400, detail="Invalid trip type")
 
+    projection, build = _view_options(view)
     trips = []
-    cursor = trip_collection.find(query).sort("created_at", -1)
+    cursor = trip_collection.find(query, projection).sort("created_at", -1)
 
     async for trip in cursor:
-        trips.append(TripResponse(
-            id=str(trip["_id"]),
-            title=trip["title"],
-            destination=trip["destination"],
-            duration_days=trip["duration_days"],
-            price=trip["price"],
-            description=trip.get("description"),
-            itinerary=trip.get("itinerary", []),
-            max_participants=trip.get("max_participants"),
-            start_date=trip.get("start_date"),
-            end_date=trip.get("end_date"),
-            category=trip.get("category"),
-            difficulty_level=trip.get("difficulty_level"),
-            image_url=trip.get("image_url"),
-            host_id=trip["host_id"],
-            joined_users=trip.get("joined_users", []),
-            created_at=trip["created_at"],
-            status=trip["status"],
-            current_participants=len(trip.get("joined_users", []))
-        ))
+        trips.append(build(trip))
 
     return trips
\ No newline at end of file
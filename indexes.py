@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Declarative MongoDB index registry.
+
+Every index the controllers and services rely on is declared here, next to
+the query it serves. ensure_indexes() is called from the FastAPI lifespan
+hook and is idempotent: creating an index that already exists with the same
+spec is a no-op on the server.
+
+Run as a script to compare declared indexes with the live database:
+
+    python indexes.py diff
+    python indexes.py apply
+"""
+import argparse
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+# Options that change index behaviour and therefore count as drift when they
+# differ between the declaration and the live index.
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+ACTIVE_ONLY = {"is_active": True}
+
+PLAN_JOB_RETENTION_SECONDS = int(os.getenv("AI_PLAN_JOB_RETENTION_SECONDS", 24 * 3600))
+# Razorpay retries a webhook delivery for up to 24 hours; dedup records must outlive that.
+WEBHOOK_EVENT_RETENTION_SECONDS = int(os.getenv("RAZORPAY_WEBHOOK_RETENTION_SECONDS", 3 * 24 * 3600))
+IDEMPOTENCY_KEY_RETENTION_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_RETENTION_SECONDS", 24 * 3600))
+
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "users": [
+        # login_user, register_user, get_current_user lookups
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # register_user / update_user_profile username checks
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "trips": [
+        # get_all_trips: {"is_active": True} sorted by (created_at, _id) desc
+        IndexModel(
+            [("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="active_created_at",
+            partialFilterExpression=ACTIVE_ONLY,
+        ),
+        # get_user_trips hosted / "all" ($or branch on host_id)
+        IndexModel(
+            [("host_id", ASCENDING), ("created_at", DESCENDING)],
+            name="active_host_created_at",
+            partialFilterExpression=ACTIVE_ONLY,
+        ),
+        # get_user_trips joined / "all" ($or branch on joined_users, multikey)
+        IndexModel(
+            [("joined_users", ASCENDING), ("created_at", DESCENDING)],
+            name="active_joined_created_at",
+            partialFilterExpression=ACTIVE_ONLY,
+        ),
+        # search_trips category filter, the most selective equality predicate
+        IndexModel(
+            [("category", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="active_category_created_at",
+            partialFilterExpression=ACTIVE_ONLY,
+        ),
+    ],
+    "chat_messages": [
+        # get_messages_for_trip: trip_id equality, keyset on (timestamp, _id)
+        # walked newest first, or forwards for after/after_id
+        IndexModel(
+            [("trip_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="trip_timestamp_id",
+        ),
+    ],
+    "payments": [
+        # get_payment_history: user_id equality, keyset on (created_at, _id) desc
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_created_at_id",
+        ),
+        # verify_payment filters on order_id (+ trip_id, user_id)
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+        # get_payment_by_id
+        IndexModel([("payment_id", ASCENDING)], name="payment_id"),
+        # PaymentSettlement.reconcile: only payments with an uncleared outbox marker
+        IndexModel([("pending_order_update.queued_at", ASCENDING)], name="pending_order_update", sparse=True),
+    ],
+    "orders": [
+        # verify_payment order status update
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+    ],
+    "ai_plan_cache": [
+        # PlanCache entries expire at their own expires_at
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "ai_plan_jobs": [
+        # PlanJobService._requeue_unfinished: queued/running jobs oldest first
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        # Finished and abandoned jobs are dropped after the retention period
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=PLAN_JOB_RETENTION_SECONDS),
+    ],
+    "webhook_events": [
+        # _id is the Razorpay event id, which de-duplicates redeliveries.
+        # WebhookService._requeue_unprocessed: queued events oldest first
+        IndexModel([("status", ASCENDING), ("received_at", ASCENDING)], name="status_received_at"),
+        IndexModel([("received_at", ASCENDING)], name="received_at_ttl", expireAfterSeconds=WEBHOOK_EVENT_RETENTION_SECONDS),
+    ],
+    "idempotency_keys": [
+        # _id is "<scope>:<Idempotency-Key>"; its unique index is what makes a
+        # claim exclusive across processes. Keys can be reused after expiry.
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=IDEMPOTENCY_KEY_RETENTION_SECONDS),
+    ],
+}
+
+def _normalize(spec: Dict[str, Any]) -> Dict[str, Any]:
+    normalized = {
+        "key": [
+            (field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in spec["key"].items()
+        ]
+    }
+    for option in COMPARED_OPTIONS:
+        if option in spec:
+            normalized[option] = spec[option]
+    return normalized
+
+async def ensure_indexes(db=None) -> Dict[str, List[str]]:
+    """
+    Create every declared index; safe to run on every startup
+    """
+    db = db if db is not None else get_database()
+    created = {}
+    for collection_name, models in INDEX_REGISTRY.items():
+        try:
+            created[collection_name] = await db[collection_name].create_indexes(models)
+        except OperationFailure as e:
+            # A conflicting live index (same name, different spec) must be
+            # resolved by hand; don't take the application down for it.
+            logger.error(f"Could not create indexes on {collection_name}: {e}")
+    return created
+
+async def diff_indexes(db=None) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Compare declared indexes against live ones, per collection
+    """
+    db = db if db is not None else get_database()
+    report = {}
+    for collection_name, models in INDEX_REGISTRY.items():
+        declared = {model.document["name"]: _normalize(model.document) for model in models}
+        live_info = await db[collection_name].index_information()
+        live = {
+            name: _normalize({**info, "key": dict(info["key"])})
+            for name, info in live_info.items()
+            if name != "_id_"
+        }
+        report[collection_name] = {
+            "missing": sorted(name for name in declared if name not in live),
+            "changed": sorted(name for name in declared if name in live and declared[name] != live[name]),
+            "undeclared": sorted(name for name in live if name not in declared),
+        }
+    return report
+
+def _print_report(report: Dict[str, Dict[str, List[str]]]) -> bool:
+    in_sync = True
+    for collection_name, sections in report.items():
+        problems = {section: names for section, names in sections.items() if names}
+        if not problems:
+            print(f"{collection_name}: in sync")
+            continue
+        in_sync = False
+        for section, names in problems.items():
+            print(f"{collection_name}: {section}: {', '.join(names)}")
+    return in_sync
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes declared in INDEX_REGISTRY")
+    parser.add_argument("command", choices=["diff", "apply"])
+    args = parser.parse_args()
+
+    if args.command == "apply":
+        created = asyncio.run(ensure_indexes())
+        for collection_name, names in created.items():
+            print(f"{collection_name}: {', '.join(names)}")
+        return
+
+    in_sync = _print_report(asyncio.run(diff_indexes()))
+    raise SystemExit(0 if in_sync else 1)
+
+if __name__ == "__main__":
+    main()
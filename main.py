@@ -4,6 +4,15 @@ from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from routes import auth_routes, trip_routes, ai_routes, chat_routes, payment_routes
 from services.socket_manager import sio
+from indexes import ensure_indexes
+from utils.metrics import collect_metrics
+from auth.password_handler import password_pool
+from services.plan_job_service import plan_job_service
+from services.razorpay_gateway import razorpay_gateway
+from services.webhook_service import webhook_service
+from services.payment_settlement import payment_settlement
+from services.chat_service import chat_write_buffer, CHAT_WRITE_BEHIND
+from contextlib import asynccontextmanager
 import socketio
 import logging
 import os
@@ -11,10 +20,34 @@ import os
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+AUTO_CREATE_INDEXES = os.getenv("AUTO_CREATE_INDEXES", "true").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_CREATE_INDEXES:
+        try:
+            await ensure_indexes()
+            logger.info("Database indexes ensured")
+        except Exception as e:
+            logger.error(f"Failed to ensure database indexes: {e}")
+    await plan_job_service.start()
+    await webhook_service.start()
+    await payment_settlement.start()
+    if CHAT_WRITE_BEHIND:
+        await chat_write_buffer.start()
+    yield
+    await chat_write_buffer.stop()
+    await payment_settlement.stop()
+    await webhook_service.stop()
+    await plan_job_service.stop()
+    await razorpay_gateway.close()
+    password_pool.shutdown()
+
 app = FastAPI(
     title="AI Trip Planner API",
     description="An advanced API for creating, sharing, and planning trips with AI assistance.",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 socket_app = socketio.ASGIApp(sio)
@@ -26,6 +59,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],
 )
 
 os.makedirs("static/images", exist_ok=True)
@@ -47,4 +81,8 @@ app.include_router(payment_routes.router, prefix="/payments", tags=["Payments"])
 
 @app.get("/", tags=["Root"])
 def read_root():
-    return {"message": "Welcome to the AI Trip Planner API", "status": "running"}
\ No newline at end of file
+    return {"message": "Welcome to the AI Trip Planner API", "status": "running"}
+
+@app.get("/metrics", tags=["Root"])
+def read_metrics():
+    return collect_metrics()
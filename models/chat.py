@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+class ChatHistoryPage(BaseModel):
+    # Serialized messages, in the same shape as the receive_message event
+    items: List[Dict[str, Any]] = []
+    next_cursor: Optional[str] = None
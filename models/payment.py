@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
 
@@ -59,4 +59,21 @@ class PaymentRecord(BaseModel):
     notes: Dict[str, Any] = Field(default_factory=dict)
     created_at: datetime
     updated_at: datetime
-    verification_date: Optional[datetime] = None 
\ No newline at end of file
+    verification_date: Optional[datetime] = None
+
+class PaymentHistoryItem(BaseModel):
+    payment_id: str
+    order_id: str
+    trip_id: str
+    amount: float
+    currency: str
+    status: PaymentStatus
+    created_at: datetime
+    verification_date: Optional[datetime] = None
+
+class PaymentHistoryPage(BaseModel):
+    items: List[PaymentHistoryItem] = []
+    next_cursor: Optional[str] = None
+
+# Fields read for PaymentHistoryItem; _id is returned too and feeds the cursor.
+PAYMENT_HISTORY_PROJECTION = {field: 1 for field in PaymentHistoryItem.model_fields}
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator
 from bson import ObjectId
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime
 
 class PyObjectId(ObjectId):
@@ -87,6 +87,28 @@ class TripResponse(BaseModel):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+class TripSummary(BaseModel):
+    id: str
+    title: str
+    destination: str
+    duration_days: int
+    price: float
+    description: Optional[str] = None
+    max_participants: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    category: Optional[str] = None
+    difficulty_level: Optional[str] = None
+    image_url: Optional[str] = None
+    host_id: str
+    created_at: datetime
+    status: str
+    current_participants: int = 0
+
+class TripPage(BaseModel):
+    items: List[Union[TripResponse, TripSummary]] = []
+    next_cursor: Optional[str] = None
+
 
 class TripUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=100)
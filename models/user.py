@@ -49,6 +49,12 @@ class UserResponse(BaseModel):
         "arbitrary_types_allowed": True
     }
 
+class Principal(BaseModel):
+    """Authenticated caller identity, taken from the access token claims"""
+    id: str
+    email: str
+    username: Optional[str] = None
+
 class UserLogin(BaseModel):
     email: EmailStr = Field(..., description="Valid email address")
     password: str = Field(..., description="User password")
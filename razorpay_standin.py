@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Razorpay REST API, for benchmarks and offline
+development. Implements the order and payment endpoints the backend uses,
+with Razorpay's response and error shapes and a configurable delay.
+
+    RAZORPAY_STANDIN_LATENCY_MS=80 uvicorn razorpay_standin:app --port 9000
+    RAZORPAY_API_BASE=http://localhost:9000 uvicorn main:app
+"""
+
+import asyncio
+import os
+import secrets
+import time
+from typing import Any, Dict
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+
+STANDIN_LATENCY_MS = float(os.getenv("RAZORPAY_STANDIN_LATENCY_MS", 50))
+
+app = FastAPI(title="Razorpay stand-in")
+basic = HTTPBasic(auto_error=False)
+orders: Dict[str, Dict[str, Any]] = {}
+
+def _error(status_code: int, code: str, description: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"error": {"code": code, "description": description}})
+
+@app.exception_handler(HTTPException)
+async def razorpay_error_handler(request, exc: HTTPException):
+    code = "BAD_REQUEST_ERROR" if exc.status_code < 500 else "SERVER_ERROR"
+    return _error(exc.status_code, code, exc.detail)
+
+async def authenticated(credentials: HTTPBasicCredentials = Depends(basic)) -> str:
+    if credentials is None or not credentials.username or not credentials.password:
+        raise HTTPException(status_code=401, detail="The api key provided is invalid")
+    await asyncio.sleep(STANDIN_LATENCY_MS / 1000)
+    return credentials.username
+
+@app.post("/v1/orders")
+async def create_order(data: Dict[str, Any], key_id: str = Depends(authenticated)):
+    amount = data.get("amount")
+    if not isinstance(amount, int) or amount < 100:
+        raise HTTPException(status_code=400, detail="The amount must be atleast INR 1.00")
+    order = {
+        "id": f"order_{secrets.token_hex(7)}",
+        "entity": "order",
+        "amount": amount,
+        "amount_paid": 0,
+        "amount_due": amount,
+        "currency": data.get("currency", "INR"),
+        "receipt": data.get("receipt"),
+        "offer_id": None,
+        "status": "created",
+        "attempts": 0,
+        "notes": data.get("notes") or [],
+        "created_at": int(time.time()),
+    }
+    orders[order["id"]] = order
+    return order
+
+@app.get("/v1/orders/{order_id}")
+async def fetch_order(order_id: str, key_id: str = Depends(authenticated)):
+    if order_id not in orders:
+        raise HTTPException(status_code=400, detail="The id provided does not exist")
+    return orders[order_id]
+
+@app.get("/v1/payments/{payment_id}")
+async def fetch_payment(payment_id: str, key_id: str = Depends(authenticated)):
+    return {
+        "id": payment_id,
+        "entity": "payment",
+        "amount": 100,
+        "currency": "INR",
+        "status": "captured",
+        "order_id": None,
+        "method": "upi",
+        "captured": True,
+        "created_at": int(time.time()),
+    }
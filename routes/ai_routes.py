@@ -1,25 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from services import ai_planner_service
+from services.plan_job_service import plan_job_service
+import json
+import logging
 # Assuming you have a get_current_user dependency for authentication
 # from auth.jwt_handler import get_current_user 
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
+CACHE_MODE_PATTERN = "^(use|bypass)$"
+
 class AIPlannerRequest(BaseModel):
     destination: str
-    duration_days: int
+    duration_days: int = Field(..., gt=0, le=ai_planner_service.MAX_TRIP_DAYS)
     budget: Optional[str] = "moderate"
     interests: Optional[List[str]] = []
 
 @router.post("/plan-trip")
 async def plan_trip_with_ai(
     request: AIPlannerRequest,
+    cache: str = Query("use", pattern=CACHE_MODE_PATTERN),
     # current_user: str = Depends(get_current_user) # Uncomment if you have auth
 ):
     try:
-        plan = await ai_planner_service.generate_trip_plan(request.dict())
+        plan = await ai_planner_service.generate_trip_plan(request.dict(), cache_mode=cache)
         return plan
     except HTTPException as e:
         # Re-raise HTTPException from the service layer directly
@@ -30,4 +39,67 @@ async def plan_trip_with_ai(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail=f"An unexpected error occurred on the server: {e}"
-        )
\ No newline at end of file
+        )
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@router.post("/plan-trip/stream")
+async def plan_trip_with_ai_stream(
+    request: AIPlannerRequest,
+    cache: str = Query("use", pattern=CACHE_MODE_PATTERN)
+):
+    """
+    Stream a trip plan as Server-Sent Events: "title", "metadata", one "day"
+    per itinerary entry, then "done" with the full plan (or "error")
+    """
+    async def event_stream():
+        try:
+            async for event, data in ai_planner_service.stream_trip_plan(request.dict(), cache_mode=cache):
+                yield _sse(event, data)
+        except HTTPException as e:
+            yield _sse("error", {"detail": e.detail})
+        except Exception as e:
+            logger.error(f"Error while streaming AI plan: {e}")
+            yield _sse("error", {"detail": "An unexpected error occurred on the server."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/plan-jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_plan_job(
+    request: AIPlannerRequest,
+    cache: str = Query("use", pattern=CACHE_MODE_PATTERN)
+):
+    """
+    Queue a trip plan generation and return the job right away. Poll
+    GET /ai/plan-jobs/{job_id}, or emit "watch_plan_job" over Socket.IO to
+    receive "plan_job_update" events.
+    """
+    try:
+        return await plan_job_service.submit(request.dict(), cache_mode=cache)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating AI plan job: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred on the server: {e}"
+        )
+
+@router.get("/plan-jobs/{job_id}")
+async def get_plan_job(job_id: str):
+    try:
+        job = await plan_job_service.get(job_id)
+    except Exception as e:
+        logger.error(f"Error fetching AI plan job: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred on the server: {e}"
+        )
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Plan job not found")
+    return job
@@ -20,6 +20,9 @@ async def register(user: UserCreate):
     try:
         logger.info(f"Attempting to register user with email: {user.email}")
         return await auth_controller.register_user(user)
+    except HTTPException:
+        # Includes the 503 from the password hash pool when it is saturated
+        raise
     except Exception as e:
         logger.error(f"Error during registration: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
@@ -29,6 +32,9 @@ async def login(user: UserLogin):
     try:
         logger.info(f"Attempting login for user with email: {user.email}")
         return await auth_controller.login_user(user)
+    except HTTPException:
+        # Includes the 503 from the password hash pool when it is saturated
+        raise
     except Exception as e:
         logger.error(f"Error during login: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
@@ -66,6 +72,9 @@ async def change_password(
             password_change.current_password, 
             password_change.new_password
         )
+    except HTTPException:
+        # Includes the 503 from the password hash pool when it is saturated
+        raise
     except Exception as e:
         logger.error(f"Error changing password: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to change password: {str(e)}")
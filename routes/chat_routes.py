@@ -1,17 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import Optional
 from services.chat_service import get_messages_for_trip
 from auth.jwt_handler import get_current_user
 
 router = APIRouter()
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 @router.get("/{trip_id}")
 async def get_chat_history(
     trip_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="Cursor from X-Next-Cursor: older messages"),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor: newer messages"),
+    after_id: Optional[str] = Query(None, description="Last message id the client has seen: only newer messages"),
     current_user: str = Depends(get_current_user)
 ):
     try:
-        messages = await get_messages_for_trip(trip_id)
-        return messages
+        page = await get_messages_for_trip(trip_id, limit, before=before, after=after, after_id=after_id)
+        if page.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+        return page.items
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Failed to retrieve messages.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to retrieve messages.")
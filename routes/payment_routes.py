@@ -1,43 +1,69 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
 from fastapi.security import HTTPBearer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import hashlib
+import json
 import logging
 from models.payment import (
     OrderCreateRequest,
     PaymentVerificationRequest,
     PaymentResponse,
-    PaymentVerificationResponse
+    PaymentVerificationResponse,
+    PaymentHistoryItem
 )
 # Use mock service for testing (comment out for production)
 from services.mock_payment_service import mock_payment_service as payment_service
 # from services.payment_service import payment_service  # Uncomment for production
-from auth.jwt_handler import verify_token
+from auth.jwt_handler import verify_token, get_current_principal
+from models.user import Principal
+from services.webhook_service import webhook_service
+from services.idempotency_service import order_idempotency
+from services.razorpay_gateway import failed_without_effect
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 security = HTTPBearer()
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 @router.post("/create-order", response_model=PaymentResponse)
 async def create_order(
     order_data: OrderCreateRequest,
-    token: str = Depends(security)
+    response: Response,
+    principal: Principal = Depends(get_current_principal),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255)
 ):
     """
-    Create a dynamic Razorpay order for trip booking
+    Create a dynamic Razorpay order for trip booking. Retries sending the same
+    Idempotency-Key receive the original order instead of creating another.
     """
     try:
-        # Verify JWT token (optional - you can remove this if not using JWT)
-        # user_data = verify_token(token.credentials)
-        
         logger.info(f"Creating order for trip: {order_data.notes.get('tripId')}")
         
-        # Create order using payment service
-        order_response = await payment_service.create_dynamic_order(order_data)
+        if idempotency_key:
+            async def create():
+                return (await payment_service.create_dynamic_order(order_data)).dict()
+
+            # Keys belong to the authenticated caller, not to ids in the body.
+            scope = f"create-order:{principal.id}"
+            stored, replayed = await order_idempotency.run(
+                scope, idempotency_key, order_data.dict(), create, released=failed_without_effect
+            )
+            order_response = PaymentResponse(**stored)
+            if replayed:
+                response.headers["Idempotent-Replayed"] = "true"
+                logger.info(f"Replayed order for idempotency key: {order_response.id}")
+                return order_response
+        else:
+            # Create order using payment service
+            order_response = await payment_service.create_dynamic_order(order_data)
         
         logger.info(f"Order created successfully: {order_response.id}")
         
         return order_response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating order: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
@@ -70,14 +96,16 @@ async def verify_payment(
         logger.error(f"Error verifying payment: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to verify payment: {str(e)}")
 
-@router.get("/history/{user_id}", response_model=List[Dict[str, Any]])
+@router.get("/history/{user_id}", response_model=List[PaymentHistoryItem])
 async def get_payment_history(
     user_id: str,
-    limit: int = 10,
+    response: Response,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     token: str = Depends(security)
 ):
     """
-    Get payment history for a user
+    Get payment history for a user, newest first
     """
     try:
         # Verify JWT token (optional - you can remove this if not using JWT)
@@ -86,10 +114,14 @@ async def get_payment_history(
         logger.info(f"Fetching payment history for user: {user_id}")
         
         # Get payment history using payment service
-        payments = await payment_service.get_payment_history(user_id, limit)
+        page = await payment_service.get_payment_history(user_id, limit, cursor)
+        if page.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
         
-        return payments
+        return page.items
         
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error fetching payment history: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch payment history: {str(e)}")
@@ -136,37 +168,31 @@ async def get_razorpay_config():
         raise HTTPException(status_code=500, detail=f"Failed to fetch Razorpay config: {str(e)}")
 
 @router.post("/webhook")
-async def razorpay_webhook(request: Dict[str, Any]):
+async def razorpay_webhook(request: Request):
     """
-    Handle Razorpay webhook events
+    Handle Razorpay webhook events: verify the signature, record the event id
+    and acknowledge; the event is applied by a background worker
     """
+    raw_body = await request.body()
+    webhook_service.verify(raw_body, request.headers.get("X-Razorpay-Signature"))
+
     try:
-        logger.info(f"Received webhook: {request}")
-        
-        # Extract webhook data
-        event_type = request.get("event")
-        payload = request.get("payload", {})
-        
-        if event_type == "payment.captured":
-            # Handle successful payment
-            payment_data = payload.get("payment", {})
-            order_data = payload.get("order", {})
-            
-            logger.info(f"Payment captured: {payment_data.get('id')}")
-            
-            # You can add additional webhook processing logic here
-            # For example, sending confirmation emails, updating trip status, etc.
-            
-        elif event_type == "payment.failed":
-            # Handle failed payment
-            payment_data = payload.get("payment", {})
-            logger.warning(f"Payment failed: {payment_data.get('id')}")
-            
-        return {"status": "success", "message": "Webhook processed"}
-        
+        event = json.loads(raw_body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    # Razorpay keeps the event id constant across retries of a delivery.
+    event_id = request.headers.get("X-Razorpay-Event-Id") or hashlib.sha256(raw_body).hexdigest()
+
+    try:
+        queued = await webhook_service.accept(event_id, event)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error processing webhook: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to process webhook: {str(e)}")
+        logger.error(f"Error recording webhook {event.get('event')} {event_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to process webhook")
+
+    logger.info(f"Received webhook {event.get('event')} {event_id}{'' if queued else ' (duplicate)'}")
+    return {"status": "success", "message": "Webhook received" if queued else "Duplicate webhook ignored"}
 
 @router.get("/health")
 async def payment_health_check():
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, Request, File, UploadFile, Form
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, File, UploadFile, Form
 from controllers import trip_controller
-from models.trip import TripBase, TripCreate, TripResponse, TripUpdate, TripSearch
-from auth.jwt_handler import get_current_user
-from typing import List, Optional
+from models.trip import TripBase, TripCreate, TripResponse, TripSummary, TripUpdate, TripSearch
+from auth.jwt_handler import get_current_principal
+from typing import List, Optional, Union
 from pydantic import BaseModel
-from database import user_collection
+from models.user import Principal
 from bson import ObjectId
 from datetime import datetime
 import os
@@ -14,6 +14,8 @@ import shutil
 router = APIRouter()
 
 IMAGE_UPLOAD_DIR = "static/images"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+VIEW_PATTERN = "^(full|summary)$"
 os.makedirs(IMAGE_UPLOAD_DIR, exist_ok=True)
 
 class TripJoinRequest(BaseModel):
@@ -32,13 +34,9 @@ async def create_trip(
     start_date: Optional[str] = Form(None),
     end_date: Optional[str] = Form(None),
     image: Optional[UploadFile] = File(None),
-    current_user_email: str = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     try:
-        user = await user_collection.find_one({"email": current_user_email})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
         try:
             duration_days_int = int(duration_days)
             price_float = float(price)
@@ -97,7 +95,7 @@ async def create_trip(
         
         trip_to_create = TripCreate(
             **trip_data_dict,
-            host_id=str(user["_id"])
+            host_id=principal.id
         )
 
         return await trip_controller.create_new_trip(trip_to_create)
@@ -108,18 +106,27 @@ async def create_trip(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to create trip: {str(e)}")
 
-@router.get("/", response_model=List[TripResponse])
+@router.get("/", response_model=Union[List[TripResponse], List[TripSummary]])
 async def get_trips(
+    response: Response,
     limit: int = Query(50, ge=1, le=100),
-    skip: int = Query(0, ge=0)
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    view: str = Query("full", pattern=VIEW_PATTERN)
 ):
     try:
-        return await trip_controller.get_all_trips(limit=limit, skip=skip)
+        page = await trip_controller.get_all_trips(limit=limit, skip=skip, cursor=cursor, view=view)
+        if page.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+        return page.items
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get trips: {str(e)}")
 
-@router.get("/search", response_model=List[TripResponse])
+@router.get("/search", response_model=Union[List[TripResponse], List[TripSummary]])
 async def search_trips(
+    response: Response,
     destination: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
     min_price: Optional[float] = Query(None, ge=0),
@@ -128,7 +135,9 @@ async def search_trips(
     max_duration: Optional[int] = Query(None, ge=1),
     difficulty_level: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=100),
-    skip: int = Query(0, ge=0)
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    view: str = Query("full", pattern=VIEW_PATTERN)
 ):
     try:
         search_params = TripSearch(
@@ -140,17 +149,23 @@ async def search_trips(
             max_duration=max_duration,
             difficulty_level=difficulty_level
         )
-        return await trip_controller.search_trips(search_params, limit=limit, skip=skip)
+        page = await trip_controller.search_trips(search_params, limit=limit, skip=skip, cursor=cursor, view=view)
+        if page.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+        return page.items
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to search trips: {str(e)}")
 
-@router.get("/my-trips", response_model=List[TripResponse])
+@router.get("/my-trips", response_model=Union[List[TripResponse], List[TripSummary]])
 async def get_my_trips(
     trip_type: str = Query("all", pattern="^(all|hosted|joined)$"),
-    current_user: str = Depends(get_current_user)
+    view: str = Query("full", pattern=VIEW_PATTERN),
+    principal: Principal = Depends(get_current_principal)
 ):
     try:
-        return await trip_controller.get_user_trips(current_user, trip_type)
+        return await trip_controller.get_user_trips(principal.id, trip_type, view=view)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get user trips: {str(e)}")
 
@@ -165,20 +180,20 @@ async def get_trip(trip_id: str):
 async def update_trip(
     trip_id: str,
     trip_update: TripUpdate,
-    current_user: str = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     try:
-        return await trip_controller.update_trip(trip_id, trip_update, current_user)
+        return await trip_controller.update_trip(trip_id, trip_update, principal.id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update trip: {str(e)}")
 
 @router.delete("/{trip_id}", status_code=204)
 async def delete_trip(
     trip_id: str,
-    current_user: str = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     try:
-        result = await trip_controller.delete_trip(trip_id, current_user)
+        result = await trip_controller.delete_trip(trip_id, principal.id)
         if not result:
             raise HTTPException(status_code=404, detail="Trip not found or user not authorized")
         return
@@ -188,20 +203,20 @@ async def delete_trip(
 @router.post("/{trip_id}/join", status_code=200)
 async def join_trip(
     trip_id: str,
-    current_user: str = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     try:
-        return await trip_controller.join_trip_by_id(trip_id, current_user)
+        return await trip_controller.join_trip_by_id(trip_id, principal.id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to join trip: {str(e)}")
 
 @router.post("/{trip_id}/leave", status_code=200)
 async def leave_trip(
     trip_id: str,
-    current_user: str = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     try:
-        return await trip_controller.leave_trip(trip_id, current_user)
+        return await trip_controller.leave_trip(trip_id, principal.id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to leave trip: {str(e)}")
 
@@ -1,46 +1,52 @@
-import google.generativeai as genai
+import asyncio
 import os
 import json
 import re
 import logging
 from fastapi import HTTPException
 from datetime import datetime, timedelta
+from services.plan_stream_parser import PlanStreamParser
+from services.plan_cache import plan_cache, normalize_plan_request, plan_cache_key
+from services.llm_scheduler import scheduler_from_env
+from services.llm_providers import provider_from_env
+from utils.singleflight import SingleFlight
+from utils.metrics import register_metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-try:
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set.")
-    genai.configure(api_key=api_key)
-except Exception as e:
-    logger.error(f"Error configuring Google Generative AI: {e}")
-    raise
-
-generation_config = {
-    "temperature": 0.8,
-    "top_p": 1,
-    "top_k": 1,
-    "max_output_tokens": 2048,
-}
-
-try:
-    model = genai.GenerativeModel(
-        model_name="gemini-2.5-flash",
-        generation_config=generation_config,
-    )
-except Exception as e:
-    logger.error(f"Error initializing Generative Model: {e}")
-    raise
+# Selected by LLM_PROVIDER: "gemini" (default) or "stub" for offline load tests.
+llm_provider = provider_from_env()
 
-async def generate_trip_plan(prompt_data: dict):
-    try:
-        prompt = f"""
+# Longer trips are generated as a skeleton plus day-range chunks so that no
+# single response has to fit the whole itinerary into max_output_tokens.
+MAX_TRIP_DAYS = int(os.getenv("AI_MAX_TRIP_DAYS", 60))
+CHUNK_DAYS = int(os.getenv("AI_CHUNK_DAYS", 7))
+CHUNK_CONCURRENCY = int(os.getenv("AI_CHUNK_CONCURRENCY", 3))
+
+llm_scheduler = scheduler_from_env(llm_provider.transient_exceptions)
+register_metrics("ai_scheduler", llm_scheduler.stats)
+
+plan_flight = SingleFlight()
+
+# Counted per plan generation, which is several LLM calls for a chunked
+# plan; upstream calls themselves are counted by ai_scheduler.
+def _plan_flight_stats():
+    stats = plan_flight.stats()
+    return {
+        "generations": stats["started"],
+        "generations_coalesced": stats["coalesced"],
+        "in_flight": stats["in_flight"],
+    }
+
+register_metrics("ai_plan_coalescing", _plan_flight_stats)
+
+def _build_prompt(prompt_data: dict) -> str:
+    return f"""
         Act as an expert travel agent. Generate a complete and detailed trip plan based on the user's criteria.
         Your response MUST be a single, valid JSON object and nothing else. Do not include any text before or after the JSON, and do not use markdown like ```json.
 
-        The JSON object must contain the following keys:
+        The JSON object must contain the following keys, in this order:
         - "title": A creative and exciting title for the trip.
         - "destination": The primary destination city and country provided by the user.
         - "description": A short, engaging summary of the trip's theme and what to expect.
@@ -59,26 +65,213 @@ async def generate_trip_plan(prompt_data: dict):
 
         Ensure the generated values for 'category' and 'difficulty_level' are exactly as they appear in the provided lists.
         """
-        
-        logger.info("Generating content with prompt...")
-        response = await model.generate_content_async(prompt)
-        
-        if not response.parts:
-            logger.error("AI response was blocked or empty. Feedback: %s", response.prompt_feedback)
+
+def _build_skeleton_prompt(prompt_data: dict) -> str:
+    duration = prompt_data['duration_days']
+    return f"""
+        Act as an expert travel agent. Outline a trip based on the user's criteria; the day-by-day itinerary will be written separately.
+        Your response MUST be a single, valid JSON object and nothing else. Do not include any text before or after the JSON, and do not use markdown like ```json.
+
+        The JSON object must contain the following keys, in this order:
+        - "title": A creative and exciting title for the trip.
+        - "destination": The primary destination city and country provided by the user.
+        - "description": A short, engaging summary of the trip's theme and what to expect.
+        - "duration_days": The number of days for the trip as an integer.
+        - "price": An estimated budget for the trip in USD, excluding flights, as an integer.
+        - "category": Choose the ONE most fitting category from this list: ["Adventure", "Cultural", "Relaxation", "Beach", "Mountain", "City"].
+        - "difficulty_level": Choose the ONE most fitting difficulty level from this list: ["Easy", "Moderate", "Challenging", "Expert"].
+        - "image_url": A URL for a high-quality, royalty-free stock photo from Unsplash that visually represents the trip (e.g., "https://images.unsplash.com/...").
+        - "day_themes": An array of exactly {duration} short strings, one per day in order, naming the area or focus of that day.
+
+        User Criteria:
+        - Destination: {prompt_data['destination']}
+        - Duration: {duration} days
+        - Budget Level: {prompt_data.get('budget', 'moderate')}
+        - Interests: {', '.join(prompt_data.get('interests', []))}
+
+        Ensure the generated values for 'category' and 'difficulty_level' are exactly as they appear in the provided lists.
+        """
+
+def _build_days_prompt(prompt_data: dict, skeleton: dict, themes: list, start: int, end: int) -> str:
+    outline = "\n".join(
+        f"        - Day {day}: {themes[day - 1]}" for day in range(start, end + 1) if day <= len(themes)
+    )
+    return f"""
+        Act as an expert travel agent writing days {start} to {end} of a {prompt_data['duration_days']}-day trip titled "{skeleton.get('title')}" to {skeleton.get('destination') or prompt_data['destination']}.
+        Your response MUST be a single, valid JSON object and nothing else. Do not include any text before or after the JSON, and do not use markdown like ```json.
+
+        The JSON object must contain one key, "itinerary": an array of exactly {end - start + 1} objects, one per day from day {start} to day {end} in order. Each day object must have "day" (integer), "title" (string), and "activities" (array of strings).
+
+        Planned focus of these days:
+{outline}
+
+        User Criteria:
+        - Budget Level: {prompt_data.get('budget', 'moderate')}
+        - Interests: {', '.join(prompt_data.get('interests', []))}
+        """
+
+def _day_ranges(total_days: int, chunk_days: int):
+    return [(start, min(start + chunk_days - 1, total_days)) for start in range(1, total_days + 1, chunk_days)]
+
+def _validate_days(days, start: int, end: int) -> list:
+    expected = end - start + 1
+    if not isinstance(days, list) or len(days) != expected or not all(
+        isinstance(day, dict) and isinstance(day.get("activities"), list) and day.get("title") for day in days
+    ):
+        logger.error(f"AI itinerary chunk for days {start}-{end} was incomplete or malformed.")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate a valid trip plan. The AI itinerary was incomplete."
+        )
+    # Chunks are requested by position, so number them by position too; the
+    # model occasionally restarts at day 1 within a chunk.
+    return [{**day, "day": start + offset} for offset, day in enumerate(days)]
+
+async def _chunked_plan_events(prompt_data: dict):
+    """
+    Generate a long plan as a skeleton followed by day-range chunks requested
+    concurrently, yielding the same events as stream_trip_plan with days in order
+    """
+    total_days = int(prompt_data["duration_days"])
+    skeleton = await _generate_json(_build_skeleton_prompt(prompt_data))
+    themes = skeleton.pop("day_themes", None) or []
+    skeleton.pop("itinerary", None)
+    skeleton["duration_days"] = total_days
+
+    yield "title", {"title": skeleton.get("title")}
+    yield "metadata", {k: v for k, v in skeleton.items() if k != "title"}
+
+    limit = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def generate_days(start: int, end: int) -> list:
+        async with limit:
+            data = await _generate_json(_build_days_prompt(prompt_data, skeleton, themes, start, end))
+        return _validate_days(data.get("itinerary"), start, end)
+
+    tasks = [asyncio.create_task(generate_days(start, end)) for start, end in _day_ranges(total_days, CHUNK_DAYS)]
+    itinerary = []
+    try:
+        for task in tasks:
+            for day in await task:
+                itinerary.append(day)
+                yield "day", day
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    yield "done", {**skeleton, "itinerary": itinerary}
+
+async def _generate_chunked_plan(prompt_data: dict) -> dict:
+    async for event, data in _chunked_plan_events(prompt_data):
+        if event == "done":
+            return data
+
+def _plan_events(plan: dict):
+    yield "title", {"title": plan.get("title")}
+    yield "metadata", {k: v for k, v in plan.items() if k not in ("title", "itinerary")}
+    for day in plan.get("itinerary", []):
+        yield "day", day
+    yield "done", plan
+
+async def stream_trip_plan(prompt_data: dict, cache_mode: str = "use"):
+    """
+    Generate a trip plan with the streaming API, yielding (event, data) pairs
+    as parts of the plan become complete: "title", then "metadata" (every
+    field before the itinerary), one "day" per itinerary entry and finally
+    "done" with the full plan. A cached plan is replayed as the same events.
+    """
+    normalized = normalize_plan_request(prompt_data)
+    cache_key = plan_cache_key(normalized)
+    if cache_mode == "bypass":
+        plan_cache.record_bypass()
+    else:
+        cached = await plan_cache.get(cache_key)
+        if cached is not None:
+            for event in _plan_events(cached):
+                yield event
+            return
+
+    if int(prompt_data["duration_days"]) > CHUNK_DAYS:
+        async for event, data in _chunked_plan_events(prompt_data):
+            if event == "done":
+                await plan_cache.set(cache_key, normalized, data)
+            yield event, data
+        return
+
+    prompt = _build_prompt(prompt_data)
+    logger.info("Streaming content with prompt...")
+
+    parser = PlanStreamParser()
+    metadata_sent = False
+    # The slot is held for the whole stream, which is what occupies the
+    # upstream connection; retries only apply until the stream has started.
+    async with llm_scheduler.slot():
+        texts = await llm_scheduler.call(lambda: llm_provider.stream(prompt))
+        try:
+            async for text in llm_scheduler.iterate(texts):
+                for event in parser.feed(text):
+                    if event[0] == "field" and event[1] == "title":
+                        yield "title", {"title": event[2]}
+                    elif event[0] == "begin" and event[1] == "itinerary" and not metadata_sent:
+                        metadata_sent = True
+                        yield "metadata", {k: v for k, v in parser.fields.items() if k != "title"}
+                    elif event[0] == "item":
+                        yield "day", event[1]
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON Decode Error while streaming: {e}")
             raise HTTPException(
                 status_code=500,
-                detail="The AI failed to generate a response, possibly due to safety filters."
+                detail="Failed to parse the trip plan. The AI response was not valid JSON."
             )
 
-        # Handle different response formats
-        if hasattr(response.parts, 'text'):
-            raw_text = response.parts.text
-        elif hasattr(response, 'text'):
-            raw_text = response.text
-        else:
-            # Try to get text from the first part
-            raw_text = response.parts[0].text if response.parts else ""
-            
+    if not parser.done:
+        logger.error("Streamed AI response ended before the JSON object was complete.")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate a valid trip plan. The AI response was incomplete."
+        )
+
+    plan = parser.result()
+    await plan_cache.set(cache_key, normalized, plan)
+    if not metadata_sent:
+        yield "metadata", {k: v for k, v in plan.items() if k not in ("title", "itinerary")}
+    yield "done", plan
+
+async def generate_trip_plan(prompt_data: dict, cache_mode: str = "use"):
+    """
+    Return a trip plan for the request, served from the plan cache when an
+    equivalent request was answered before. cache_mode="bypass" skips the
+    lookup and refreshes the cached plan.
+    """
+    normalized = normalize_plan_request(prompt_data)
+    cache_key = plan_cache_key(normalized)
+    if cache_mode == "bypass":
+        plan_cache.record_bypass()
+    else:
+        cached = await plan_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    async def generate_and_store():
+        plan = await _generate_plan(prompt_data)
+        await plan_cache.set(cache_key, normalized, plan)
+        return plan
+
+    # Identical requests arriving while a generation is in flight await that
+    # generation instead of starting their own.
+    return await plan_flight.do(cache_key, generate_and_store)
+
+async def _generate_plan(prompt_data: dict):
+    if int(prompt_data["duration_days"]) > CHUNK_DAYS:
+        return await _generate_chunked_plan(prompt_data)
+    return await _generate_json(_build_prompt(prompt_data))
+
+async def _generate_json(prompt: str):
+    try:
+        logger.info("Generating content with prompt...")
+        raw_text = await llm_scheduler.run(lambda: llm_provider.generate(prompt))
+
         if not raw_text:
             logger.error("No text content found in AI response")
             raise HTTPException(
@@ -108,6 +301,8 @@ async def generate_trip_plan(prompt_data: dict):
             status_code=500, 
             detail="Failed to parse the trip plan. The AI response was not valid JSON."
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"An unexpected error occurred while generating the AI plan: {e}")
         raise HTTPException(
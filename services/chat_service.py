@@ -1,38 +1,524 @@
-from database import chat_collection, user_collection
+from database import chat_collection
 from bson import ObjectId
+from models.chat import ChatHistoryPage
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
 from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from utils.metrics import Histogram, register_metrics
+from utils.pagination import decode_cursor, encode_cursor, keyset_filter, merge_filters, next_cursor_for
+from utils.singleflight import SingleFlight
+import asyncio
+import logging
+import os
+import time
 
-async def save_message(trip_id: str, user_id: str, message: str):
-    user = await user_collection.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        return None
+logger = logging.getLogger(__name__)
+
+# Buffer chat inserts and write them in batches (see ChatWriteBuffer).
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "false").lower() == "true"
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", 100))
+CHAT_WRITE_FLUSH_MS = float(os.getenv("CHAT_WRITE_FLUSH_MS", 50))
+CHAT_WRITE_BUFFER_SIZE = int(os.getenv("CHAT_WRITE_BUFFER_SIZE", 5000))
+CHAT_WRITE_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("CHAT_WRITE_SHUTDOWN_TIMEOUT_SECONDS", 10))
+CHAT_WRITE_RETRY_SECONDS = 1.0
+
+# Recent messages kept in memory per trip room, and the estimated memory
+# they (and the rooms themselves) may use across all rooms.
+CHAT_RECENT_PER_ROOM = int(os.getenv("CHAT_RECENT_PER_ROOM", 100))
+CHAT_RECENT_MAX_BYTES = int(os.getenv("CHAT_RECENT_MAX_BYTES", 32 * 1024 * 1024))
+# Longer messages are refused by send_message.
+CHAT_MAX_MESSAGE_LENGTH = int(os.getenv("CHAT_MAX_MESSAGE_LENGTH", 4000))
+
+DUPLICATE_KEY = 11000
 
+def serialize_message(message_doc: Dict[str, Any]) -> Dict[str, Any]:
+    message = dict(message_doc)
+    message["_id"] = str(message["_id"])
+    if isinstance(message["timestamp"], datetime):
+        message["timestamp"] = message["timestamp"].isoformat()
+    return message
+
+def _now_ms() -> datetime:
+    # BSON dates have millisecond precision; truncating up front keeps the
+    # in-memory copy identical to what is read back from Mongo.
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def build_message(trip_id: str, user_id: str, username: str, message: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Build the document for a chat message and its serialized form. The _id is
+    generated here, so the message can be broadcast before it is stored.
+    """
     message_doc = {
+        "_id": ObjectId(),
         "trip_id": trip_id,
         "user_id": user_id,
-        "username": user.get("username", "Unknown"),
+        "username": username,
         "message": message,
-        "timestamp": datetime.utcnow()
+        "timestamp": _now_ms()
     }
-    result = await chat_collection.insert_one(message_doc)
-    
-    # Use the inserted_id from the result
-    inserted_doc = await chat_collection.find_one({"_id": result.inserted_id})
-    
-    if inserted_doc:
-        inserted_doc["_id"] = str(inserted_doc["_id"])
-        if isinstance(inserted_doc["timestamp"], datetime):
-            inserted_doc["timestamp"] = inserted_doc["timestamp"].isoformat()
-        return inserted_doc
-    
-    return None
-
-async def get_messages_for_trip(trip_id: str, limit: int = 50):
-    messages = []
-    cursor = chat_collection.find({"trip_id": trip_id}).sort("timestamp", 1).limit(limit)
-    async for message in cursor:
-        message["_id"] = str(message["_id"])
-        if isinstance(message["timestamp"], datetime):
-            message["timestamp"] = message["timestamp"].isoformat()
-        messages.append(message)
-    return messages
\ No newline at end of file
+    return message_doc, serialize_message(message_doc)
+
+class ChatWriteBuffer:
+    """
+    Write-behind buffer for chat messages. Messages are queued in memory and
+    written with insert_many(ordered=False) once batch_size are waiting or
+    every flush_ms, whichever comes first. When max_pending messages are
+    waiting, add() blocks until a flush makes room. A batch that fails as a
+    whole (network or write concern error) stays queued and is retried;
+    because _id is generated by the caller, messages from a retried batch
+    that had already landed come back as duplicate keys and are skipped.
+    stop() flushes whatever is left before returning; senders still waiting
+    for room, or arriving during shutdown, write their message directly.
+    """
+
+    BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+    def __init__(self, collection, batch_size: int = CHAT_WRITE_BATCH_SIZE,
+                 flush_ms: float = CHAT_WRITE_FLUSH_MS, max_pending: int = CHAT_WRITE_BUFFER_SIZE):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.max_pending = max(max_pending, batch_size)
+        self._pending: Deque[Dict[str, Any]] = deque()
+        # The batch flush() has taken off _pending and is writing now
+        self._inflight: List[Dict[str, Any]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._has_room: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        # Senders inside add() that are waiting for room or writing directly
+        self._waiting = 0
+        self.flush_latency = Histogram()
+        self.batch_sizes = Histogram(self.BATCH_BUCKETS)
+        self.written = 0
+        self.retried = 0
+        self.backpressure_waits = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._flusher is not None
+
+    async def start(self) -> None:
+        if self._flusher is not None:
+            return
+        self._wake = asyncio.Event()
+        self._has_room = asyncio.Event()
+        self._has_room.set()
+        self._lock = asyncio.Lock()
+        self._stopping = False
+        self._flusher = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        if self._flusher is None:
+            return
+        flusher, self._flusher = self._flusher, None
+        # Let the flusher finish its current write instead of cancelling it
+        # mid-batch. Senders blocked in add() wake up and write directly.
+        self._stopping = True
+        self._wake.set()
+        self._has_room.set()
+        await asyncio.gather(flusher, return_exceptions=True)
+
+        # Drain what is left; retry failed batches until the deadline.
+        deadline = time.monotonic() + CHAT_WRITE_SHUTDOWN_TIMEOUT_SECONDS
+        while self._pending and time.monotonic() < deadline:
+            if not await self.flush():
+                await asyncio.sleep(min(CHAT_WRITE_RETRY_SECONDS, max(deadline - time.monotonic(), 0)))
+        if self._pending:
+            logger.error(f"Dropped {len(self._pending)} chat messages that could not be written at shutdown")
+            self.dropped += len(self._pending)
+            self._pending.clear()
+        while self._waiting and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    async def add(self, message_doc: Dict[str, Any]) -> None:
+        if self._stopping or len(self._pending) >= self.max_pending:
+            self._waiting += 1
+            try:
+                while not self._stopping and len(self._pending) >= self.max_pending:
+                    self.backpressure_waits += 1
+                    self._has_room.clear()
+                    self._wake.set()
+                    await self._has_room.wait()
+                if self._stopping:
+                    # Nothing flushes after shutdown; write straight through.
+                    await self.collection.insert_one(message_doc)
+                    self.written += 1
+                    return
+            finally:
+                self._waiting -= 1
+        self._pending.append(message_doc)
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    async def _flush_forever(self) -> None:
+        while not self._stopping:
+            if len(self._pending) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+            if self._stopping:
+                return
+            if not await self.flush():
+                await asyncio.sleep(CHAT_WRITE_RETRY_SECONDS)
+
+    async def flush(self) -> bool:
+        """
+        Write everything pending in batches; returns False if a batch failed
+        (its messages stay queued for the next attempt)
+        """
+        async with self._lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._inflight = batch
+                try:
+                    if not await self._write(batch):
+                        return False
+                finally:
+                    self._inflight = []
+            return True
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        started = time.monotonic()
+        failed: List[Dict[str, Any]] = []
+        rejected = 0
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                failed = batch
+            else:
+                # Per-document errors won't succeed on retry; a duplicate key
+                # means an earlier attempt already stored the message.
+                errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY]
+                if errors:
+                    rejected = len(errors)
+                    logger.error(f"Dropped {rejected} chat messages rejected by the database: {errors[0].get('errmsg')}")
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} chat messages: {e}")
+            failed = batch
+        finally:
+            self.flush_latency.observe(time.monotonic() - started)
+            self.batch_sizes.observe(len(batch))
+
+        self.dropped += rejected
+        self.written += len(batch) - len(failed) - rejected
+        if failed:
+            self.errors += 1
+            self.retried += len(failed)
+            self._pending.extendleft(reversed(failed))
+        if len(self._pending) < self.max_pending:
+            self._has_room.set()
+        return not failed
+
+    def pending_message(self, message_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """
+        Return a message that is buffered or being written, if any
+        """
+        for message_doc in reversed(self._pending):
+            if message_doc["_id"] == message_id:
+                return message_doc
+        for message_doc in self._inflight:
+            if message_doc["_id"] == message_id:
+                return message_doc
+        return None
+
+    def pending_for_trip(self, trip_id: str) -> List[Dict[str, Any]]:
+        """
+        Return a trip's messages that are buffered or being written
+        """
+        return [
+            message_doc for message_doc in [*self._inflight, *self._pending]
+            if message_doc["trip_id"] == trip_id
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.running,
+            "pending": len(self._pending),
+            "written": self.written,
+            "retried": self.retried,
+            "backpressure_waits": self.backpressure_waits,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "flush_latency_seconds": self.flush_latency.snapshot(),
+            "batch_size": self.batch_sizes.snapshot(),
+        }
+
+chat_write_buffer = ChatWriteBuffer(chat_collection)
+register_metrics("chat_write_buffer", chat_write_buffer.stats)
+
+MessageKey = Tuple[datetime, ObjectId]
+
+def _message_key(message_doc: Dict[str, Any]) -> MessageKey:
+    return message_doc["timestamp"], message_doc["_id"]
+
+def _entry_key(entry: Tuple[MessageKey, Dict[str, Any]]) -> MessageKey:
+    return entry[0]
+
+# Rough per-object costs (dicts, tuples, keys) on top of the string payload
+ROOM_OVERHEAD_BYTES = 512
+ENTRY_OVERHEAD_BYTES = 1024
+
+def _entry_bytes(entry: Tuple[MessageKey, Dict[str, Any]]) -> int:
+    return ENTRY_OVERHEAD_BYTES + sum(len(value) for value in entry[1].values() if isinstance(value, str))
+
+class _Room:
+    __slots__ = ("entries", "has_older", "bytes")
+
+    def __init__(self):
+        # (key, serialized message), ascending by (timestamp, _id)
+        self.entries: List[Tuple[MessageKey, Dict[str, Any]]] = []
+        # Whether older messages exist in Mongo beyond the buffer
+        self.has_older = False
+        self.bytes = ROOM_OVERHEAD_BYTES
+
+class RecentMessages:
+    """
+    Ring buffers of the latest serialized messages per trip room, so history
+    for active rooms is served without a query. A room's buffer always holds
+    its newest messages contiguously: it is seeded from Mongo by the first
+    history read and kept current by add(), which only touches rooms already
+    buffered. Rooms are evicted LRU once their estimated size, which counts
+    every room (even an empty one) as well as its messages, passes max_bytes
+    in total. Like Socket.IO broadcasting, this assumes a room's messages are
+    sent through this process.
+    """
+
+    def __init__(self, collection, per_room: int = CHAT_RECENT_PER_ROOM, max_bytes: int = CHAT_RECENT_MAX_BYTES):
+        self.collection = collection
+        self.per_room = per_room
+        self.max_bytes = max_bytes
+        self._rooms: "OrderedDict[str, _Room]" = OrderedDict()
+        # Messages added while a room is being seeded, merged in afterwards
+        self._seeding: Dict[str, List[Tuple[MessageKey, Dict[str, Any]]]] = {}
+        self._flight = SingleFlight()
+        self._size = 0
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add(self, message_doc: Dict[str, Any], message: Dict[str, Any]) -> None:
+        trip_id = message_doc["trip_id"]
+        entry = (_message_key(message_doc), message)
+        room = self._rooms.get(trip_id)
+        if room is not None:
+            self._insert(room, entry)
+            self._trim(room)
+            self._rooms.move_to_end(trip_id)
+            self._evict()
+        elif trip_id in self._seeding:
+            self._seeding[trip_id].append(entry)
+
+    def _insert(self, room: _Room, entry: Tuple[MessageKey, Dict[str, Any]]) -> None:
+        index = bisect_left(room.entries, entry[0], key=_entry_key)
+        if index < len(room.entries) and room.entries[index][0] == entry[0]:
+            return
+        room.entries.insert(index, entry)
+        size = _entry_bytes(entry)
+        room.bytes += size
+        self._bytes += size
+        self._size += 1
+
+    def _trim(self, room: _Room) -> None:
+        overflow = len(room.entries) - self.per_room
+        if overflow > 0:
+            size = sum(_entry_bytes(entry) for entry in room.entries[:overflow])
+            del room.entries[:overflow]
+            room.has_older = True
+            room.bytes -= size
+            self._bytes -= size
+            self._size -= overflow
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._rooms:
+            _, room = self._rooms.popitem(last=False)
+            self._size -= len(room.entries)
+            self._bytes -= room.bytes
+            self.evictions += 1
+
+    def message_key(self, trip_id: str, message_id: ObjectId) -> Optional[MessageKey]:
+        room = self._rooms.get(trip_id)
+        if room is not None:
+            for key, _ in reversed(room.entries):
+                if key[1] == message_id:
+                    return key
+        return None
+
+    def page(
+        self,
+        trip_id: str,
+        limit: int,
+        before: Optional[MessageKey] = None,
+        after: Optional[MessageKey] = None
+    ) -> Optional[ChatHistoryPage]:
+        """
+        Answer a get_messages_for_trip page from memory, or return None when
+        the buffer can't tell the whole answer
+        """
+        room = self._rooms.get(trip_id)
+        if room is None:
+            self.misses += 1
+            return None
+
+        entries = room.entries
+        if after is not None:
+            if room.has_older and (not entries or after < entries[0][0]):
+                self.misses += 1
+                return None
+            newer = entries[bisect_right(entries, after, key=_entry_key):]
+            selected = newer[:limit]
+            more = len(newer) > limit
+            cursor_entry = selected[-1] if more else None
+        else:
+            older = entries if before is None else entries[:bisect_left(entries, before, key=_entry_key)]
+            if room.has_older and len(older) < limit:
+                self.misses += 1
+                return None
+            selected = older[-limit:]
+            more = len(older) > limit or room.has_older
+            cursor_entry = selected[0] if more and selected else None
+
+        self.hits += 1
+        self._rooms.move_to_end(trip_id)
+        return ChatHistoryPage(
+            items=[message for _, message in reversed(selected)],
+            next_cursor=encode_cursor(*cursor_entry[0]) if cursor_entry else None
+        )
+
+    async def seed(self, trip_id: str) -> None:
+        """
+        Load a room's newest messages from Mongo (concurrent calls share one load)
+        """
+        if self.per_room <= 0 or trip_id in self._rooms:
+            return
+        await self._flight.do(trip_id, lambda: self._seed(trip_id))
+
+    async def _seed(self, trip_id: str) -> None:
+        self._seeding[trip_id] = []
+        # Taken before the query: a batch that finishes writing while the
+        # query runs may be missing from both the query and a later look.
+        unwritten = chat_write_buffer.pending_for_trip(trip_id)
+        try:
+            docs = await self.collection.find({"trip_id": trip_id}).sort(
+                [("timestamp", DESCENDING), ("_id", DESCENDING)]
+            ).limit(self.per_room + 1).to_list(length=self.per_room + 1)
+        finally:
+            added = self._seeding.pop(trip_id)
+
+        room = _Room()
+        room.has_older = len(docs) > self.per_room
+        room.entries = [(_message_key(doc), serialize_message(doc)) for doc in reversed(docs[:self.per_room])]
+        room.bytes += sum(_entry_bytes(entry) for entry in room.entries)
+        self._size += len(room.entries)
+        self._bytes += room.bytes
+        # Messages sent meanwhile, or not yet written, may be missing from
+        # the query; _insert skips the ones that are not.
+        for message_doc in unwritten:
+            self._insert(room, (_message_key(message_doc), serialize_message(message_doc)))
+        for entry in added:
+            self._insert(room, entry)
+        self._trim(room)
+        self._rooms[trip_id] = room
+        self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "rooms": len(self._rooms),
+            "messages": self._size,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "per_room": self.per_room,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "coalesced_seeds": self._flight.coalesced,
+        }
+
+recent_messages = RecentMessages(chat_collection)
+register_metrics("chat_recent_messages", recent_messages.stats)
+
+async def persist_message(message_doc: Dict[str, Any]) -> None:
+    if chat_write_buffer.running:
+        await chat_write_buffer.add(message_doc)
+    else:
+        await chat_collection.insert_one(message_doc)
+
+async def _seen_message_key(trip_id: str, message_id: str) -> MessageKey:
+    if not ObjectId.is_valid(message_id):
+        raise ValueError("Invalid message id")
+    message_id = ObjectId(message_id)
+    key = recent_messages.message_key(trip_id, message_id)
+    if key is not None:
+        return key
+
+    message_doc = chat_write_buffer.pending_message(message_id)
+    if message_doc is None:
+        message_doc = await chat_collection.find_one({"_id": message_id}, {"trip_id": 1, "timestamp": 1})
+    if not message_doc or message_doc["trip_id"] != trip_id:
+        raise ValueError("Unknown message id")
+    return _message_key(message_doc)
+
+async def get_messages_for_trip(
+    trip_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    after_id: Optional[str] = None
+) -> ChatHistoryPage:
+    """
+    Get a page of a trip's chat history, newest first. Without a cursor this
+    is the latest messages, and before pages back through older ones. after,
+    or after_id (the last message a client has seen), selects only newer
+    messages: the page holds the oldest limit of them, so a reconnecting
+    client can catch up without refetching everything. next_cursor continues
+    in the same direction. Pages are served from recent_messages when it
+    holds them. Raises ValueError for a malformed cursor or an unknown
+    message id.
+    """
+    if sum(value is not None for value in (before, after, after_id)) > 1:
+        raise ValueError("Use only one of before, after and after_id")
+    before_key = decode_cursor(before) if before else None
+    after_key = decode_cursor(after) if after else None
+    if after_id is not None:
+        after_key = await _seen_message_key(trip_id, after_id)
+
+    page = recent_messages.page(trip_id, limit, before_key, after_key)
+    if page is None and before_key is None and after_key is None and limit <= recent_messages.per_room:
+        # Opening a chat: load the room's recent messages once for everyone.
+        await recent_messages.seed(trip_id)
+        page = recent_messages.page(trip_id, limit)
+    if page is not None:
+        return page
+
+    query = {"trip_id": trip_id}
+    direction = DESCENDING
+    if before_key:
+        query = merge_filters(query, keyset_filter("timestamp", before))
+    elif after_key:
+        query = merge_filters(query, keyset_filter("timestamp", encode_cursor(*after_key), descending=False))
+        direction = ASCENDING
+
+    # Served by the (trip_id, timestamp, _id) index in either direction;
+    # limit + 1 tells whether another page exists.
+    docs = await chat_collection.find(query).sort(
+        [("timestamp", direction), ("_id", direction)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = next_cursor_for(docs, limit, "timestamp")
+
+    docs = docs[:limit]
+    if direction == ASCENDING:
+        docs.reverse()
+    return ChatHistoryPage(items=[serialize_message(doc) for doc in docs], next_cursor=next_cursor)
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+from database import get_database
+from utils.cache import TTLCache
+from utils.metrics import register_metrics
+from utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 4096))
+IDEMPOTENCY_CACHE_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_CACHE_TTL_SECONDS", 600))
+# How long a duplicate waits for the original request to finish before 409.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 10))
+IDEMPOTENCY_POLL_SECONDS = 0.1
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class IdempotencyStore:
+    """
+    Executes an operation at most once per idempotency key and replays its
+    stored response for retries. Keys are claimed in Mongo (the _id makes the
+    claim unique across processes), completed responses are kept in a hot
+    in-memory cache, and concurrent duplicates within a process share one
+    execution.
+
+    If the operation fails in a way known to have had no side effect
+    (released(exc) is true), the claim is released so a retry can run it.
+    Any other failure, cancellation included, may have happened after the
+    side effect, so the key is marked failed and retries get 409 until the
+    record is reconciled.
+    """
+
+    def __init__(self, collection_name: str):
+        self.collection = get_database().get_collection(collection_name)
+        self.cache = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_CACHE_TTL_SECONDS)
+        self.flight = SingleFlight()
+        self.executed = 0
+        self.replayed = 0
+        self.mismatched = 0
+        self.conflicts = 0
+        self.failed = 0
+
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        payload: Dict[str, Any],
+        operation: Callable[[], Awaitable[Dict[str, Any]]],
+        released: Callable[[BaseException], bool] = lambda exc: False,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return (response, replayed). A key reused with a different payload is
+        rejected with 422; one still being processed elsewhere, or whose
+        first attempt ended with an unknown outcome, with 409.
+        """
+        record_id = f"{scope}:{key}"
+        fingerprint = request_fingerprint(payload)
+
+        record = self.cache.get(record_id)
+        executed_here = False
+        if record is None:
+            async def execute():
+                nonlocal executed_here
+                executed_here = True
+                return await self._execute(record_id, fingerprint, operation, released)
+
+            record = await self.flight.do(record_id, execute)
+
+        if record["request_hash"] != fingerprint:
+            self.mismatched += 1
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request"
+            )
+
+        replayed = not (executed_here and record["executed"])
+        if replayed:
+            self.replayed += 1
+        return record["response"], replayed
+
+    async def _execute(self, record_id: str, fingerprint: str, operation, released) -> Dict[str, Any]:
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            try:
+                await self.collection.insert_one({
+                    "_id": record_id,
+                    "request_hash": fingerprint,
+                    "status": "in_progress",
+                    "created_at": datetime.utcnow(),
+                })
+                break
+            except DuplicateKeyError:
+                existing = await self.collection.find_one({"_id": record_id})
+
+            if existing is None:
+                # The original attempt failed and released its claim.
+                continue
+            if existing["status"] == "completed" or existing["request_hash"] != fingerprint:
+                record = {"request_hash": existing["request_hash"], "response": existing.get("response"), "executed": False}
+                if existing["status"] == "completed":
+                    self.cache.set(record_id, record)
+                return record
+            if existing["status"] == "failed":
+                self.conflicts += 1
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="An earlier request with this Idempotency-Key failed with an unknown outcome; "
+                           "it must be reconciled before the key can be used again"
+                )
+            if time.monotonic() >= deadline:
+                self.conflicts += 1
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still being processed",
+                    headers={"Retry-After": "1"},
+                )
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+        try:
+            response = jsonable_encoder(await operation())
+        except BaseException as e:
+            if released(e):
+                # Nothing happened; let a retry with the same key run it again.
+                await self.collection.delete_one({"_id": record_id, "status": "in_progress"})
+            else:
+                self.failed += 1
+                logger.error(f"Idempotent operation {record_id} failed with an unknown outcome: {e!r}")
+                await self.collection.update_one(
+                    {"_id": record_id, "status": "in_progress"},
+                    {"$set": {"status": "failed", "error": repr(e), "failed_at": datetime.utcnow()}}
+                )
+            raise
+
+        self.executed += 1
+        record = {"request_hash": fingerprint, "response": response, "executed": True}
+        self.cache.set(record_id, record)
+        try:
+            await self.collection.update_one(
+                {"_id": record_id},
+                {"$set": {"status": "completed", "response": response, "completed_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.error(f"Could not store idempotent response for {record_id}: {e}")
+        return record
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "mismatched": self.mismatched,
+            "conflicts": self.conflicts,
+            "failed": self.failed,
+            "coalesced": self.flight.coalesced,
+            "cache": self.cache.stats(),
+        }
+
+order_idempotency = IdempotencyStore("idempotency_keys")
+register_metrics("order_idempotency", order_idempotency.stats)
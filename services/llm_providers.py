@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Tuple, Type
+from fastapi import HTTPException, status
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+class LLMProvider(ABC):
+    """
+    Text generation backend used by the AI planner. generate() returns the
+    full response text; stream() starts a streamed generation and returns an
+    async iterator of text pieces.
+    """
+
+    name = "base"
+    # Errors worth retrying (rate limiting, temporary unavailability).
+    transient_exceptions: Tuple[Type[BaseException], ...] = ()
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        ...
+
+    @abstractmethod
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        ...
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini. The client is configured on first use, so the application
+    starts without GOOGLE_API_KEY and only AI requests fail.
+    """
+
+    name = "gemini"
+    transient_exceptions = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.BadGateway,
+        google_exceptions.GatewayTimeout,
+        google_exceptions.DeadlineExceeded,
+    )
+
+    generation_config = {
+        "temperature": 0.8,
+        "top_p": 1,
+        "top_k": 1,
+        "max_output_tokens": 2048,
+    }
+
+    def __init__(self, model_name: str = "gemini-2.5-flash"):
+        self.model_name = model_name
+        self._model = None
+
+    def _get_model(self):
+        if self._model is None:
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                logger.error("Error configuring Google Generative AI: GOOGLE_API_KEY environment variable not set.")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="The AI service is not configured."
+                )
+            genai.configure(api_key=api_key)
+            self._model = genai.GenerativeModel(
+                model_name=self.model_name,
+                generation_config=self.generation_config,
+            )
+        return self._model
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._get_model().generate_content_async(prompt)
+
+        if not response.parts:
+            logger.error("AI response was blocked or empty. Feedback: %s", response.prompt_feedback)
+            raise HTTPException(
+                status_code=500,
+                detail="The AI failed to generate a response, possibly due to safety filters."
+            )
+
+        # Handle different response formats
+        if hasattr(response.parts, 'text'):
+            return response.parts.text
+        if hasattr(response, 'text'):
+            return response.text
+        return response.parts[0].text if response.parts else ""
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self._get_model().generate_content_async(prompt, stream=True)
+
+        async def texts():
+            async for chunk in response:
+                if chunk.parts:
+                    yield chunk.text
+
+        return texts()
+
+STUB_CATEGORIES = ["Adventure", "Cultural", "Relaxation", "Beach", "Mountain", "City"]
+STUB_DIFFICULTIES = ["Easy", "Moderate", "Challenging", "Expert"]
+STUB_THEMES = ["Old town", "Markets", "Museums", "Waterfront", "Parks and gardens", "Local food", "Day trip", "Hidden corners"]
+STUB_ACTIVITIES = [
+    "Guided walking tour", "Breakfast at a local cafe", "Visit the main museum", "Street food tasting",
+    "Sunset viewpoint", "Cooking class", "Boat ride", "Craft market", "Historic quarter stroll", "Live music evening",
+]
+
+class StubProvider(LLMProvider):
+    """
+    Deterministic local backend for load tests and CI. It reads the criteria
+    back out of the planner's prompts and returns schema-valid JSON, after a
+    simulated time to first token and token rate.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = 300, tokens_per_sec: float = 200, chunk_chars: int = 64):
+        self.latency = latency_ms / 1000
+        self.tokens_per_sec = tokens_per_sec
+        self.chunk_chars = chunk_chars
+
+    def _token_delay(self, text: str) -> float:
+        # Roughly four characters per token, as for English text.
+        if self.tokens_per_sec <= 0:
+            return 0.0
+        return (len(text) / 4) / self.tokens_per_sec
+
+    async def generate(self, prompt: str) -> str:
+        text = self.respond(prompt)
+        await asyncio.sleep(self.latency + self._token_delay(text))
+        return text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text = self.respond(prompt)
+        await asyncio.sleep(self.latency)
+
+        async def texts():
+            for i in range(0, len(text), self.chunk_chars):
+                piece = text[i:i + self.chunk_chars]
+                await asyncio.sleep(self._token_delay(piece))
+                yield piece
+
+        return texts()
+
+    @staticmethod
+    def _criterion(prompt: str, label: str, default: str = "") -> str:
+        match = re.search(rf"- {label}: (.*)", prompt)
+        return match.group(1).strip() if match else default
+
+    def respond(self, prompt: str) -> str:
+        rng = random.Random(hashlib.sha256(prompt.encode()).hexdigest())
+        interests = [i.strip() for i in self._criterion(prompt, "Interests").split(",") if i.strip()]
+
+        chunk = re.search(r"writing days (\d+) to (\d+) of a (\d+)-day trip titled \"(.*)\" to (.*)\.", prompt)
+        if chunk:
+            start, end = int(chunk.group(1)), int(chunk.group(2))
+            return json.dumps({"itinerary": [self._day(rng, day, chunk.group(5), interests) for day in range(start, end + 1)]})
+
+        destination = self._criterion(prompt, "Destination", "Somewhere")
+        duration = int(self._criterion(prompt, "Duration", "3 days").split()[0])
+        plan = {
+            "title": f"{rng.choice(['Discover', 'Explore', 'Wander', 'Taste'])} {destination}",
+            "destination": destination,
+            "description": f"A {duration}-day {self._criterion(prompt, 'Budget Level', 'moderate')} trip through {destination}"
+                           + (f" focused on {', '.join(interests)}." if interests else "."),
+            "duration_days": duration,
+            "price": rng.randrange(100, 400) * duration,
+            "category": rng.choice(STUB_CATEGORIES),
+            "difficulty_level": rng.choice(STUB_DIFFICULTIES),
+            "image_url": f"https://images.unsplash.com/photo-{rng.randrange(10 ** 12, 10 ** 13)}",
+        }
+        if '"day_themes"' in prompt:
+            plan["day_themes"] = [rng.choice(STUB_THEMES) for _ in range(duration)]
+        else:
+            plan["itinerary"] = [self._day(rng, day, destination, interests) for day in range(1, duration + 1)]
+        return json.dumps(plan, indent=2)
+
+    def _day(self, rng: random.Random, day: int, destination: str, interests: list) -> dict:
+        activities = rng.sample(STUB_ACTIVITIES, 3)
+        if interests:
+            activities.append(f"{rng.choice(interests).capitalize()} in {destination}")
+        return {"day": day, "title": f"{rng.choice(STUB_THEMES)} in {destination}", "activities": activities}
+
+def provider_from_env() -> LLMProvider:
+    name = os.getenv("LLM_PROVIDER", "gemini").lower()
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "stub":
+        return StubProvider(
+            latency_ms=float(os.getenv("LLM_STUB_LATENCY_MS", 300)),
+            tokens_per_sec=float(os.getenv("LLM_STUB_TOKENS_PER_SEC", 200)),
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
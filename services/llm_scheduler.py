@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Tuple, Type
+from fastapi import HTTPException, status
+from utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+class LLMScheduler:
+    """
+    Admission control around upstream LLM calls: a concurrency cap with a
+    bounded wait queue, per-call deadlines, jittered exponential retries on
+    transient errors and a circuit breaker that fails fast while the
+    provider is unhealthy.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        call_timeout: float,
+        max_retries: int,
+        retry_base_delay: float,
+        retry_max_delay: float,
+        breaker_threshold: int,
+        breaker_cooldown: float,
+        transient_exceptions: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.transient_exceptions = (asyncio.TimeoutError,) + tuple(transient_exceptions)
+
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+
+        self._state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.queue_wait = Histogram()
+        self.call_latency = Histogram()
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.rejected_queue_full = 0
+        self.rejected_queue_timeout = 0
+        self.rejected_circuit_open = 0
+
+    def _admit(self) -> None:
+        if self._state == "open":
+            if time.monotonic() - self._opened_at < self.breaker_cooldown:
+                self.rejected_circuit_open += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="The AI service is temporarily unavailable, please try again shortly.",
+                    headers={"Retry-After": str(int(self.breaker_cooldown))},
+                )
+            self._state = "half_open"
+
+        # In half-open state exactly one trial call probes the provider.
+        if self._state == "half_open" and self._probe_in_flight:
+            self.rejected_circuit_open += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The AI service is temporarily unavailable, please try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+
+        if self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many AI requests in progress, please retry shortly.",
+                headers={"Retry-After": "1"},
+            )
+
+        if self._state == "half_open":
+            self._probe_in_flight = True
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one of the concurrency slots, waiting in the bounded queue if needed
+        """
+        self._admit()
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_queue_timeout += 1
+            self._probe_in_flight = False
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The AI service is busy, please retry shortly.",
+                headers={"Retry-After": "1"},
+            )
+        except BaseException:
+            self._probe_in_flight = False
+            raise
+        finally:
+            self.waiting -= 1
+            self.queue_wait.observe(time.monotonic() - started)
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._probe_in_flight = False
+            self._slots.release()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn with a deadline, retrying transient failures with jittered
+        exponential backoff. Must be called while holding a slot.
+        """
+        attempt = 0
+        while True:
+            self.calls += 1
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(fn(), timeout=self.call_timeout)
+            except self.transient_exceptions as e:
+                self.call_latency.observe(time.monotonic() - started)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                if attempt >= self.max_retries:
+                    self._record_failure()
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise HTTPException(
+                            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                            detail="The AI service did not respond in time."
+                        )
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="The AI service is temporarily unavailable, please try again shortly.",
+                        headers={"Retry-After": "1"},
+                    )
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Transient AI error ({type(e).__name__}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.call_latency.observe(time.monotonic() - started)
+                # Not a provider health problem (bad request, safety block,
+                # cancellation): don't count it against the breaker.
+                self._probe_in_flight = False
+                raise
+
+            self.call_latency.observe(time.monotonic() - started)
+            self._record_success()
+            return result
+
+    async def run(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        async with self.slot():
+            return await self.call(fn)
+
+    async def iterate(self, stream: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        """
+        Iterate a streamed response, applying the call deadline to each chunk
+        """
+        iterator = stream.__aiter__()
+        while True:
+            try:
+                item = await asyncio.wait_for(iterator.__anext__(), timeout=self.call_timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self._record_failure()
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail="The AI service stopped responding."
+                )
+            yield item
+
+    def _record_success(self) -> None:
+        self.successes += 1
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+        if self._state != "closed":
+            logger.info("AI circuit breaker closed")
+        self._state = "closed"
+
+    def _record_failure(self) -> None:
+        self.failures += 1
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+        if self._state == "half_open" or self._consecutive_failures >= self.breaker_threshold:
+            if self._state != "open":
+                logger.error(f"AI circuit breaker opened after {self._consecutive_failures} consecutive failures")
+            self._state = "open"
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit_state": self._state,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_queue_timeout": self.rejected_queue_timeout,
+            "rejected_circuit_open": self.rejected_circuit_open,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "call_latency_seconds": self.call_latency.snapshot(),
+        }
+
+def scheduler_from_env(transient_exceptions: Tuple[Type[BaseException], ...] = ()) -> LLMScheduler:
+    return LLMScheduler(
+        max_concurrency=int(os.getenv("AI_MAX_CONCURRENCY", 4)),
+        max_queue=int(os.getenv("AI_MAX_QUEUE", 32)),
+        queue_timeout=float(os.getenv("AI_QUEUE_TIMEOUT_SECONDS", 30)),
+        call_timeout=float(os.getenv("AI_CALL_TIMEOUT_SECONDS", 60)),
+        max_retries=int(os.getenv("AI_MAX_RETRIES", 2)),
+        retry_base_delay=float(os.getenv("AI_RETRY_BASE_DELAY_SECONDS", 0.5)),
+        retry_max_delay=float(os.getenv("AI_RETRY_MAX_DELAY_SECONDS", 8)),
+        breaker_threshold=int(os.getenv("AI_BREAKER_THRESHOLD", 5)),
+        breaker_cooldown=float(os.getenv("AI_BREAKER_COOLDOWN_SECONDS", 30)),
+        transient_exceptions=transient_exceptions,
+    )
@@ -0,0 +1,35 @@
+import logging
+from typing import Optional
+from models.payment import PaymentHistoryItem, PaymentHistoryPage, PAYMENT_HISTORY_PROJECTION
+from utils.pagination import keyset_filter, merge_filters, next_cursor_for
+
+logger = logging.getLogger(__name__)
+
+async def get_payment_history_page(payments_collection, user_id: str, limit: int = 10, cursor: Optional[str] = None) -> PaymentHistoryPage:
+    """
+    Get a page of payment history for a user, newest first; shared by the
+    real and mock payment services. Raises ValueError for a malformed cursor.
+    """
+    query = {"user_id": user_id}
+    if cursor:
+        query = merge_filters(query, keyset_filter("created_at", cursor))
+
+    try:
+        if payments_collection is None:
+            logger.warning("Database not available - returning empty payment history")
+            return PaymentHistoryPage()
+
+        # Served by the (user_id, created_at, _id) index; limit + 1 tells
+        # whether another page exists.
+        docs = await payments_collection.find(
+            query, PAYMENT_HISTORY_PROJECTION
+        ).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1).to_list(length=limit + 1)
+
+        return PaymentHistoryPage(
+            items=[PaymentHistoryItem(**doc) for doc in docs[:limit]],
+            next_cursor=next_cursor_for(docs, limit, "created_at")
+        )
+
+    except Exception as e:
+        logger.error(f"Error fetching payment history: {str(e)}")
+        return PaymentHistoryPage()
@@ -1,4 +1,3 @@
-import razorpay
 import hashlib
 import hmac
 import json
@@ -11,9 +10,13 @@ from models.payment import (
     PaymentResponse, 
     PaymentVerificationResponse,
     PaymentRecord,
-    PaymentStatus
+    PaymentStatus,
+    PaymentHistoryPage
 )
 from database import get_database
+from services.razorpay_gateway import razorpay_gateway
+from services.payment_settlement import payment_settlement
+from services.payment_history import get_payment_history_page
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,8 +28,8 @@ class PaymentService:
         self.key_id = RAZORPAY_CONFIG["KEY_ID"]
         self.key_secret = RAZORPAY_CONFIG["KEY_SECRET"]
         
-        # Initialize Razorpay client
-        self.client = razorpay.Client(auth=(self.key_id, self.key_secret))
+        # Async Razorpay API client with pooled keep-alive connections
+        self.gateway = razorpay_gateway
         
         # Get database connection
         try:
@@ -61,7 +64,7 @@ class PaymentService:
             logger.info(f"Creating Razorpay order with data: {razorpay_order_data}")
             
             # Create order with Razorpay
-            razorpay_order = self.client.order.create(data=razorpay_order_data)
+            razorpay_order = await self.gateway.create_order(razorpay_order_data)
             
             # Store order in database
             if self.orders_collection is not None:
@@ -169,18 +172,19 @@ class PaymentService:
             }
             
             payment_update = {
-                "$set": {
-                    "razorpay_payment_id": verification_data.razorpay_payment_id,
-                    "razorpay_signature": verification_data.razorpay_signature,
-                    "status": PaymentStatus.SUCCESS,
-                    "verification_date": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
+                "razorpay_payment_id": verification_data.razorpay_payment_id,
+                "razorpay_signature": verification_data.razorpay_signature,
+                "status": PaymentStatus.SUCCESS,
+                "verification_date": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
             }
             
-            result = await self.payments_collection.update_one(payment_filter, payment_update)
+            # Payment and order are marked paid together (transaction or outbox)
+            updated = await payment_settlement.mark_paid(
+                payment_filter, payment_update, verification_data.razorpay_order_id
+            )
             
-            if result.modified_count == 0:
+            if not updated:
                 logger.warning(f"No payment record found for order: {verification_data.razorpay_order_id}")
                 return PaymentVerificationResponse(
                     verified=False,
@@ -194,15 +198,6 @@ class PaymentService:
                     message="Payment record not found"
                 )
             
-            # Update order status
-            if self.orders_collection is not None:
-                await self.orders_collection.update_one(
-                    {"order_id": verification_data.razorpay_order_id},
-                    {"$set": {"status": "paid", "updated_at": datetime.utcnow()}}
-                )
-            else:
-                logger.warning("Database not available - skipping order status update")
-            
             logger.info(f"Payment verified successfully: {verification_data.razorpay_payment_id}")
             
             return PaymentVerificationResponse(
@@ -231,25 +226,12 @@ class PaymentService:
                 message=f"Payment verification error: {str(e)}"
             )
     
-    async def get_payment_history(self, user_id: str, limit: int = 10) -> list:
+    async def get_payment_history(self, user_id: str, limit: int = 10, cursor: Optional[str] = None) -> PaymentHistoryPage:
         """
-        Get payment history for a user
+        Get a page of payment history for a user, newest first. Raises
+        ValueError for a malformed cursor.
         """
-        try:
-            if self.payments_collection is None:
-                logger.warning("Database not available - returning empty payment history")
-                return []
-                
-            cursor = self.payments_collection.find(
-                {"user_id": user_id}
-            ).sort("created_at", -1).limit(limit)
-            
-            payments = await cursor.to_list(length=limit)
-            return payments
-            
-        except Exception as e:
-            logger.error(f"Error fetching payment history: {str(e)}")
-            return []
+        return await get_payment_history_page(self.payments_collection, user_id, limit, cursor)
     
     async def get_payment_by_id(self, payment_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from pymongo.errors import OperationFailure
+from database import get_database
+from utils.metrics import Histogram, register_metrics
+
+logger = logging.getLogger(__name__)
+
+# "auto" uses multi-document transactions when connected to a replica set or
+# sharded cluster; "off" always uses the outbox marker.
+PAYMENT_TRANSACTIONS = os.getenv("PAYMENT_TRANSACTIONS", "auto").lower()
+RECONCILE_INTERVAL_SECONDS = float(os.getenv("PAYMENT_RECONCILE_INTERVAL_SECONDS", 10))
+# Markers younger than this belong to requests that are probably still running.
+RECONCILE_GRACE_SECONDS = float(os.getenv("PAYMENT_RECONCILE_GRACE_SECONDS", 5))
+RECONCILE_BATCH_SIZE = 100
+
+# Returned by servers that cannot run transactions (standalone mongod).
+ILLEGAL_OPERATION = 20
+
+class PaymentSettlement:
+    """
+    Marks a verified payment and its order as paid together. With transaction
+    support both updates commit atomically; otherwise the payment update
+    carries a pending_order_update marker in the same single-document write,
+    and a background reconciler re-applies any order update that a crash
+    left behind.
+    """
+
+    def __init__(self):
+        self.db = get_database()
+        self.payments_collection = self.db.payments
+        self.orders_collection = self.db.orders
+        self._transactions: Optional[bool] = None if PAYMENT_TRANSACTIONS == "auto" else False
+        self._reconciler: Optional[asyncio.Task] = None
+        self._background: set = set()
+        self.latency = Histogram()
+        self.transactional = 0
+        self.outbox = 0
+        self.reconciled = 0
+        self.errors = 0
+
+    async def _supports_transactions(self) -> bool:
+        if self._transactions is None:
+            try:
+                hello = await self.db.client.admin.command("hello")
+                self._transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+            except Exception as e:
+                logger.warning(f"Could not detect transaction support, using the outbox: {e}")
+                self._transactions = False
+            logger.info(f"Payment settlement mode: {'transaction' if self._transactions else 'outbox'}")
+        return self._transactions
+
+    async def mark_paid(self, payment_filter: Dict[str, Any], payment_set: Dict[str, Any], order_id: str) -> bool:
+        """
+        Apply payment_set to the matching payment and mark order_id paid;
+        returns False (and leaves the order alone) if no payment was updated
+        """
+        started = time.monotonic()
+        try:
+            if await self._supports_transactions():
+                try:
+                    return await self._mark_paid_in_transaction(payment_filter, payment_set, order_id)
+                except OperationFailure as e:
+                    if e.code != ILLEGAL_OPERATION:
+                        raise
+                    logger.warning("Transactions are not supported by this deployment, using the outbox")
+                    self._transactions = False
+            return await self._mark_paid_with_outbox(payment_filter, payment_set, order_id)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.latency.observe(time.monotonic() - started)
+
+    async def _mark_paid_in_transaction(self, payment_filter, payment_set, order_id) -> bool:
+        async def apply(session):
+            result = await self.payments_collection.update_one(payment_filter, {"$set": payment_set}, session=session)
+            if result.modified_count == 0:
+                return False
+            await self.orders_collection.update_one(
+                {"order_id": order_id},
+                {"$set": {"status": "paid", "updated_at": datetime.utcnow()}},
+                session=session
+            )
+            return True
+
+        async with await self.db.client.start_session() as session:
+            # with_transaction retries transient errors and unknown commit results.
+            updated = await session.with_transaction(apply)
+        if updated:
+            self.transactional += 1
+        return updated
+
+    async def _mark_paid_with_outbox(self, payment_filter, payment_set, order_id) -> bool:
+        marker = {"order_id": order_id, "status": "paid", "queued_at": datetime.utcnow()}
+        result = await self.payments_collection.update_one(
+            payment_filter,
+            {"$set": {**payment_set, "pending_order_update": marker}}
+        )
+        if result.modified_count == 0:
+            return False
+
+        await self._apply_order_update(marker)
+        self.outbox += 1
+        # Clearing the marker is bookkeeping; don't make the caller wait for it.
+        task = asyncio.create_task(self._clear_marker(payment_filter, marker))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return True
+
+    async def _apply_order_update(self, marker: Dict[str, Any]) -> None:
+        await self.orders_collection.update_one(
+            {"order_id": marker["order_id"]},
+            {"$set": {"status": marker["status"], "updated_at": datetime.utcnow()}}
+        )
+
+    async def _clear_marker(self, payment_filter: Dict[str, Any], marker: Dict[str, Any]) -> None:
+        try:
+            await self.payments_collection.update_one(
+                {**payment_filter, "pending_order_update.queued_at": marker["queued_at"]},
+                {"$unset": {"pending_order_update": ""}}
+            )
+        except Exception as e:
+            # The reconciler will re-apply and clear it.
+            logger.warning(f"Could not clear order update marker for {marker['order_id']}: {e}")
+
+    async def start(self) -> None:
+        if self._reconciler is None:
+            self._reconciler = asyncio.create_task(self._reconcile_forever())
+
+    async def stop(self) -> None:
+        tasks: List[asyncio.Task] = list(self._background)
+        if self._reconciler is not None:
+            self._reconciler.cancel()
+            tasks.append(self._reconciler)
+            self._reconciler = None
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _reconcile_forever(self) -> None:
+        while True:
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Payment reconciliation failed: {e}")
+            await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+
+    async def reconcile(self) -> int:
+        """
+        Re-apply order updates whose outbox markers were never cleared
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=RECONCILE_GRACE_SECONDS)
+        docs = await self.payments_collection.find(
+            {"pending_order_update.queued_at": {"$lt": cutoff}},
+            {"pending_order_update": 1}
+        ).limit(RECONCILE_BATCH_SIZE).to_list(length=RECONCILE_BATCH_SIZE)
+
+        for doc in docs:
+            marker = doc["pending_order_update"]
+            await self._apply_order_update(marker)
+            await self._clear_marker({"_id": doc["_id"]}, marker)
+            self.reconciled += 1
+            logger.info(f"Reconciled order status for {marker['order_id']}")
+        return len(docs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": {None: "undetected", True: "transaction", False: "outbox"}[self._transactions],
+            "transactional": self.transactional,
+            "outbox": self.outbox,
+            "reconciled": self.reconciled,
+            "errors": self.errors,
+            "latency_seconds": self.latency.snapshot(),
+        }
+
+payment_settlement = PaymentSettlement()
+register_metrics("payment_settlement", payment_settlement.stats)
@@ -0,0 +1,118 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from database import get_database
+from utils.cache import TTLCache
+from utils.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_TTL_SECONDS = int(os.getenv("AI_PLAN_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+PLAN_CACHE_MEMORY_SIZE = int(os.getenv("AI_PLAN_CACHE_MEMORY_SIZE", 256))
+PLAN_CACHE_MEMORY_TTL_SECONDS = int(os.getenv("AI_PLAN_CACHE_MEMORY_TTL_SECONDS", 3600))
+
+def _clean(value: Any) -> str:
+    return " ".join(str(value).split()).casefold()
+
+def normalize_plan_request(prompt_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a plan request to the fields that determine the plan, so that
+    "Paris ", "paris" and ["Art", "food", "art"] share one cache entry
+    """
+    interests = {_clean(interest) for interest in prompt_data.get("interests") or []}
+    interests.discard("")
+    return {
+        "destination": _clean(prompt_data["destination"]),
+        "duration_days": int(prompt_data["duration_days"]),
+        "budget": _clean(prompt_data.get("budget") or "moderate"),
+        "interests": sorted(interests),
+    }
+
+def plan_cache_key(normalized: Dict[str, Any]) -> str:
+    raw = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class PlanCache:
+    """
+    Two-tier cache for generated trip plans: a per-process LRU in front of a
+    Mongo collection whose documents expire through a TTL index on expires_at
+    """
+
+    def __init__(self):
+        self.memory = TTLCache(maxsize=PLAN_CACHE_MEMORY_SIZE, ttl=PLAN_CACHE_MEMORY_TTL_SECONDS)
+        self.collection = get_database().get_collection("ai_plan_cache")
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.writes = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        plan = self.memory.get(key)
+        if plan is not None:
+            self.memory_hits += 1
+            return copy.deepcopy(plan)
+
+        try:
+            # The TTL monitor only runs periodically, so check expiry here too.
+            doc = await self.collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+                {"plan": 1, "expires_at": 1}
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"AI plan cache lookup failed: {e}")
+            doc = None
+
+        if not doc:
+            self.misses += 1
+            return None
+
+        self.db_hits += 1
+        remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+        self.memory.set(key, doc["plan"], ttl=min(remaining, PLAN_CACHE_MEMORY_TTL_SECONDS))
+        return copy.deepcopy(doc["plan"])
+
+    async def set(self, key: str, normalized: Dict[str, Any], plan: Dict[str, Any]) -> None:
+        self.memory.set(key, copy.deepcopy(plan))
+        now = datetime.utcnow()
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {
+                    "request": normalized,
+                    "plan": plan,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=PLAN_CACHE_TTL_SECONDS),
+                },
+                upsert=True
+            )
+            self.writes += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"AI plan cache write failed: {e}")
+
+    def record_bypass(self) -> None:
+        self.bypassed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        hits = self.memory_hits + self.db_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "bypassed": self.bypassed,
+            "writes": self.writes,
+            "errors": self.errors,
+            "memory": self.memory.stats(),
+        }
+
+plan_cache = PlanCache()
+register_metrics("ai_plan_cache", plan_cache.stats)
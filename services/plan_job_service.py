@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+from database import get_database
+from services import ai_planner_service
+from services.socket_server import plan_job_room, sio
+from utils.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+PLAN_JOB_WORKERS = int(os.getenv("AI_PLAN_JOB_WORKERS", 2))
+PLAN_JOB_QUEUE_SIZE = int(os.getenv("AI_PLAN_JOB_QUEUE_SIZE", 100))
+# A job still marked running this long after its last update is assumed to
+# belong to a worker process that died, and is queued again on startup.
+PLAN_JOB_STALE_SECONDS = int(os.getenv("AI_PLAN_JOB_STALE_SECONDS", 600))
+# How often queued jobs that didn't fit in the in-process queue are picked
+# up from Mongo (and stale running jobs requeued).
+PLAN_JOB_POLL_SECONDS = float(os.getenv("AI_PLAN_JOB_POLL_SECONDS", 30))
+
+class PlanJobService:
+    """
+    Runs AI plan generation as background jobs. Job state and results live in
+    the ai_plan_jobs collection; an in-process queue feeds a small pool of
+    worker tasks, and every state change is pushed to the job's Socket.IO room.
+    Queued jobs that are not in the in-process queue (left over from a
+    restart, or queued while it was full) are picked up by a poller.
+    """
+
+    def __init__(self):
+        self.collection = get_database().get_collection("ai_plan_jobs")
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._poller: Optional[asyncio.Task] = None
+        # Ids in the in-process queue, so the poller doesn't add them twice
+        self._queued_ids: Set[str] = set()
+        # Queue slots held by submits that are still inserting their job
+        self._reserved = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=PLAN_JOB_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(PLAN_JOB_WORKERS)]
+        try:
+            await self._requeue_unfinished()
+        except Exception as e:
+            logger.error(f"Could not requeue unfinished AI plan jobs: {e}")
+        self._poller = asyncio.create_task(self._poll_forever())
+
+    async def stop(self) -> None:
+        tasks = list(self._workers)
+        if self._poller is not None:
+            tasks.append(self._poller)
+            self._poller = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+
+    def _free_slots(self) -> int:
+        return PLAN_JOB_QUEUE_SIZE - self._queue.qsize() - self._reserved
+
+    def _enqueue(self, job_id: str) -> None:
+        if job_id in self._queued_ids:
+            return
+        self._queue.put_nowait(job_id)
+        self._queued_ids.add(job_id)
+
+    async def submit(self, prompt_data: Dict[str, Any], cache_mode: str = "use") -> Dict[str, Any]:
+        if self._queue is None or self._free_slots() <= 0:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many AI planning jobs queued, please retry shortly.",
+                headers={"Retry-After": "5"},
+            )
+
+        now = datetime.utcnow()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "status": "queued",
+            "request": prompt_data,
+            "cache_mode": cache_mode,
+            "created_at": now,
+            "updated_at": now,
+        }
+        # Hold a slot across the insert so concurrent submits can't overfill the queue.
+        self._reserved += 1
+        try:
+            await self.collection.insert_one(job)
+        finally:
+            self._reserved -= 1
+        self._enqueue(job["_id"])
+        self.submitted += 1
+        return self.public_view(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.collection.find_one({"_id": job_id})
+        return self.public_view(job) if job else None
+
+    @staticmethod
+    def public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+        view = {
+            "job_id": job["_id"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+        }
+        if job["status"] == "succeeded":
+            view["result"] = job.get("result")
+        elif job["status"] == "failed":
+            view["error"] = job.get("error")
+        return view
+
+    async def _requeue_unfinished(self) -> None:
+        stale_before = datetime.utcnow() - timedelta(seconds=PLAN_JOB_STALE_SECONDS)
+        await self.collection.update_many(
+            {"status": "running", "updated_at": {"$lt": stale_before}},
+            {"$set": {"status": "queued", "updated_at": datetime.utcnow()}}
+        )
+        free = self._free_slots()
+        if free <= 0:
+            return
+        cursor = self.collection.find(
+            {"status": "queued", "_id": {"$nin": list(self._queued_ids)}}, {"_id": 1}
+        ).sort("created_at", 1).limit(free)
+        async for job in cursor:
+            if self._free_slots() <= 0:
+                break
+            self._enqueue(job["_id"])
+
+    async def _poll_forever(self) -> None:
+        while True:
+            await asyncio.sleep(PLAN_JOB_POLL_SECONDS)
+            try:
+                await self._requeue_unfinished()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Could not requeue unfinished AI plan jobs: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued_ids.discard(job_id)
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"AI plan job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        # Claim atomically so a job requeued by several processes runs once.
+        job = await self.collection.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {"$set": {"status": "running", "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not job:
+            return
+        await self._notify(job)
+
+        update = {"updated_at": datetime.utcnow()}
+        try:
+            result = await ai_planner_service.generate_trip_plan(job["request"], cache_mode=job.get("cache_mode", "use"))
+            update.update({"status": "succeeded", "result": result})
+            self.succeeded += 1
+        except HTTPException as e:
+            update.update({"status": "failed", "error": {"status_code": e.status_code, "detail": e.detail}})
+            self.failed += 1
+        except Exception as e:
+            logger.error(f"AI plan job {job_id} failed: {e}")
+            update.update({"status": "failed", "error": {"status_code": 500, "detail": "An unexpected error occurred."}})
+            self.failed += 1
+
+        update["finished_at"] = update["updated_at"] = datetime.utcnow()
+        job = await self.collection.find_one_and_update(
+            {"_id": job_id},
+            {"$set": update},
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            await self._notify(job)
+
+    async def _notify(self, job: Dict[str, Any]) -> None:
+        try:
+            payload = jsonable_encoder(self.public_view(job))
+            await sio.emit("plan_job_update", payload, room=plan_job_room(job["_id"]))
+        except Exception as e:
+            logger.warning(f"Could not notify watchers of AI plan job {job['_id']}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": PLAN_JOB_QUEUE_SIZE,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+plan_job_service = PlanJobService()
+register_metrics("ai_plan_jobs", plan_job_service.stats)
@@ -0,0 +1,99 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+class PlanStreamParser:
+    """
+    Incremental parser for the trip plan JSON object as it streams in from
+    the model.
+
+    feed() returns the events that became complete with the new text:
+    ("begin", key) when a top-level value starts, ("field", key, value) when
+    a top-level value is complete and ("item", value) for each complete object
+    inside the top-level "itinerary" array. Text before the opening brace
+    (e.g. a markdown fence) and after the closing brace is ignored.
+    """
+
+    def __init__(self, array_key: str = "itinerary"):
+        self.array_key = array_key
+        self.fields: Dict[str, Any] = {}
+        self.items: List[Any] = []
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = "start"
+        self._key: Optional[str] = None
+        self._key_start = 0
+        self._value_start = 0
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple]:
+        self._text += chunk
+        text = self._text
+        events: List[Tuple] = []
+        i = self._pos
+
+        while i < len(text) and not self.done:
+            c = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._state == "key" and self._depth == 1:
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._state = "colon"
+            elif self._state == "start":
+                if c == "{":
+                    self._depth = 1
+                    self._state = "key"
+            elif c == '"':
+                self._in_string = True
+                if self._state == "key" and self._depth == 1:
+                    self._key_start = i
+            elif c == ":" and self._depth == 1 and self._state == "colon":
+                self._state = "value"
+                self._value_start = i + 1
+                events.append(("begin", self._key))
+            elif c in "{[":
+                self._depth += 1
+                if c == "{" and self._depth == 3 and self._key == self.array_key:
+                    self._item_start = i
+            elif c in "}]":
+                if c == "}" and self._depth == 3 and self._item_start is not None:
+                    item = json.loads(text[self._item_start:i + 1])
+                    self.items.append(item)
+                    events.append(("item", item))
+                    self._item_start = None
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value(text, i, events)
+                    self.done = True
+            elif c == "," and self._depth == 1 and self._state == "value":
+                self._finish_value(text, i, events)
+                self._state = "key"
+
+            i += 1
+
+        self._pos = i
+        return events
+
+    def _finish_value(self, text: str, end: int, events: List[Tuple]) -> None:
+        if self._state != "value":
+            return
+        raw = text[self._value_start:end].strip()
+        if not raw:
+            return
+        value = json.loads(raw)
+        self.fields[self._key] = value
+        events.append(("field", self._key, value))
+
+    def result(self) -> Dict[str, Any]:
+        if not self.done:
+            raise ValueError("Trip plan JSON is incomplete")
+        return dict(self.fields)
@@ -0,0 +1,124 @@
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+import httpx
+from utils.metrics import Histogram, register_metrics
+
+logger = logging.getLogger(__name__)
+
+RAZORPAY_API_BASE = os.getenv("RAZORPAY_API_BASE", "https://api.razorpay.com")
+RAZORPAY_TIMEOUT_SECONDS = float(os.getenv("RAZORPAY_TIMEOUT_SECONDS", 10))
+RAZORPAY_CONNECT_TIMEOUT_SECONDS = float(os.getenv("RAZORPAY_CONNECT_TIMEOUT_SECONDS", 3))
+RAZORPAY_MAX_CONNECTIONS = int(os.getenv("RAZORPAY_MAX_CONNECTIONS", 50))
+RAZORPAY_MAX_KEEPALIVE = int(os.getenv("RAZORPAY_MAX_KEEPALIVE", 20))
+
+class RazorpayError(Exception):
+    """
+    A failed Razorpay API call; status_code is None when no response arrived.
+    no_effect is True when Razorpay certainly did not act on the request: the
+    connection was never made, or the request was rejected with a 4xx.
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, no_effect: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.no_effect = no_effect
+
+# Raised before the request was sent, so Razorpay never saw it
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+def failed_without_effect(exc: BaseException) -> bool:
+    """
+    Whether exc, or an error it wraps, is a Razorpay call known to have
+    changed nothing
+    """
+    while exc is not None:
+        if isinstance(exc, RazorpayError):
+            return exc.no_effect
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+class RazorpayGateway:
+    """
+    Async client for the Razorpay REST API. One pooled httpx client is shared
+    by all requests so connections (and TLS sessions) are kept alive between
+    orders instead of blocking the event loop in the synchronous SDK.
+    """
+
+    def __init__(self, key_id: str, key_secret: str, base_url: str = RAZORPAY_API_BASE):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.base_url = base_url
+        self._client: Optional[httpx.AsyncClient] = None
+        self.latency = Histogram()
+        self.requests = 0
+        self.errors = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.key_id, self.key_secret),
+                timeout=httpx.Timeout(RAZORPAY_TIMEOUT_SECONDS, connect=RAZORPAY_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=RAZORPAY_MAX_CONNECTIONS,
+                    max_keepalive_connections=RAZORPAY_MAX_KEEPALIVE,
+                ),
+            )
+        return self._client
+
+    async def _request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        self.requests += 1
+        started = time.monotonic()
+        try:
+            response = await self._get_client().request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.errors += 1
+            raise RazorpayError(
+                f"Razorpay request failed: {type(e).__name__}", no_effect=isinstance(e, UNSENT_ERRORS)
+            ) from e
+        finally:
+            self.latency.observe(time.monotonic() - started)
+
+        if response.status_code >= 400:
+            self.errors += 1
+            try:
+                description = response.json().get("error", {}).get("description")
+            except ValueError:
+                description = None
+            raise RazorpayError(
+                description or f"Razorpay returned HTTP {response.status_code}",
+                response.status_code,
+                no_effect=response.status_code < 500
+            )
+        return response.json()
+
+    async def create_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request("POST", "/v1/orders", json=data)
+
+    async def fetch_order(self, order_id: str) -> Dict[str, Any]:
+        return await self._request("GET", f"/v1/orders/{order_id}")
+
+    async def fetch_payment(self, payment_id: str) -> Dict[str, Any]:
+        return await self._request("GET", f"/v1/payments/{payment_id}")
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_seconds": self.latency.snapshot(),
+        }
+
+def gateway_from_config() -> RazorpayGateway:
+    from config.razorpay_config import RAZORPAY_CONFIG
+    return RazorpayGateway(RAZORPAY_CONFIG["KEY_ID"], RAZORPAY_CONFIG["KEY_SECRET"])
+
+razorpay_gateway = gateway_from_config()
+register_metrics("razorpay", razorpay_gateway.stats)
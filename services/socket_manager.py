@@ -1,13 +1,64 @@
+import asyncio
+import logging
+import os
 import socketio
-from services.chat_service import save_message
-from services.user_service import get_user_from_token
+import time
+from urllib.parse import parse_qs
+from fastapi.encoders import jsonable_encoder
+from services.chat_service import CHAT_MAX_MESSAGE_LENGTH, build_message, persist_message, recent_messages
+from services.plan_job_service import plan_job_service
+from services.socket_server import plan_job_room, sio
+from services.user_service import get_identity_from_token
 
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+logger = logging.getLogger(__name__)
+
+# When a chat message is broadcast relative to its insert:
+#   after_ack  - broadcast once stored (a failed insert is never broadcast)
+#   before_ack - broadcast first, then store
+#   parallel   - broadcast and store concurrently
+CHAT_BROADCAST_MODE = os.getenv("CHAT_BROADCAST_MODE", "after_ack").lower()
+if CHAT_BROADCAST_MODE not in ("after_ack", "before_ack", "parallel"):
+    raise ValueError(f"Unknown CHAT_BROADCAST_MODE: {CHAT_BROADCAST_MODE}")
+
+def _connect_token(environ, auth):
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    query = parse_qs(environ.get('QUERY_STRING', ''))
+    if query.get('token'):
+        return query['token'][0]
+    header = environ.get('HTTP_AUTHORIZATION', '')
+    if header.lower().startswith('bearer '):
+        return header[7:]
+    return None
 
 @sio.event
-async def connect(sid, environ):
+async def connect(sid, environ, auth=None):
+    # Authenticate once per connection; handlers read the identity from the
+    # session instead of verifying a token and loading the user per message.
+    # Clients that don't send a token here still work through the legacy
+    # per-message token.
+    token = _connect_token(environ, auth)
+    if token:
+        identity = await get_identity_from_token(token)
+        if not identity:
+            raise socketio.exceptions.ConnectionRefusedError('authentication failed')
+        await sio.save_session(sid, identity)
     print(f"Socket connected: {sid}")
 
+async def _session_identity(sid, token=None):
+    session = await sio.get_session(sid)
+    expires_at = session.get('expires_at')
+    if session.get('user_id') and (expires_at is None or expires_at > time.time()):
+        return session
+
+    if not token:
+        return None
+    identity = await get_identity_from_token(token)
+    if identity:
+        # Remember it so later messages on this connection skip the lookup.
+        await sio.save_session(sid, identity)
+    return identity
+
 @sio.on('join_room')
 async def join_room(sid, data):
     room = data.get('trip_id')
@@ -17,24 +68,65 @@ async def join_room(sid, data):
         await sio.enter_room(sid, room) 
         print(f"SID {sid} joined room {room}")
 
+async def deliver_message(message_doc, message, room, mode=None):
+    """
+    Store a chat message and broadcast it to the room, ordered by CHAT_BROADCAST_MODE
+    """
+    mode = mode or CHAT_BROADCAST_MODE
+
+    def broadcast():
+        return sio.emit('receive_message', message, room=room)
+
+    async def store():
+        await persist_message(message_doc)
+        # Stored: keep it for history reads of active rooms, whether or not
+        # the broadcast goes through.
+        recent_messages.add(message_doc, message)
+
+    if mode == 'before_ack':
+        await broadcast()
+        await store()
+    elif mode == 'parallel':
+        await asyncio.gather(broadcast(), store())
+    else:
+        await store()
+        await broadcast()
+
 @sio.on('send_message')
 async def send_message(sid, data):
     trip_id = data.get('trip_id')
     message_text = data.get('message')
-    token = data.get('token')
 
-    if not all([trip_id, message_text, token]):
+    if not all([trip_id, message_text]) or not isinstance(message_text, str):
         return
 
-    user = await get_user_from_token(token)
-    if not user:
+    identity = await _session_identity(sid, data.get('token'))
+    if not identity:
         return
     
-    user_id_str = str(user['_id'])
-    saved_message = await save_message(trip_id, user_id_str, message_text)
-    
-    if saved_message:
-        await sio.emit('receive_message', saved_message, room=trip_id)
+    message_doc, message = build_message(trip_id, identity['user_id'], identity['username'], message_text)
+    if len(message_text) > CHAT_MAX_MESSAGE_LENGTH:
+        await sio.emit('message_failed', {'_id': message['_id'], 'trip_id': trip_id, 'error': 'Message too long'}, to=sid)
+        return
+    try:
+        await deliver_message(message_doc, message, trip_id)
+    except Exception as e:
+        logger.error(f"Failed to deliver chat message {message['_id']}: {e}")
+        # Tell the sender, whose client may already show the message as sent.
+        await sio.emit('message_failed', {'_id': message['_id'], 'trip_id': trip_id, 'error': 'Message could not be delivered'}, to=sid)
+
+@sio.on('watch_plan_job')
+async def watch_plan_job(sid, data):
+    job_id = data.get('job_id')
+    if not job_id:
+        return
+    await sio.enter_room(sid, plan_job_room(job_id))
+
+    # The job may have finished before the client subscribed; send the
+    # current state so the watcher never misses the final update.
+    job = await plan_job_service.get(job_id)
+    if job:
+        await sio.emit('plan_job_update', jsonable_encoder(job), to=sid)
 
 @sio.event
 async def disconnect(sid):
@@ -0,0 +1,9 @@
+import socketio
+
+# The Socket.IO server lives here, apart from the event handlers in
+# socket_manager, so services that emit events (e.g. plan jobs) can import it
+# without importing the handlers that in turn depend on those services.
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+def plan_job_room(job_id: str) -> str:
+    return f"plan_job:{job_id}"
@@ -1,14 +1,22 @@
+from typing import Any, Dict, Optional
 from database import user_collection
 from auth.jwt_handler import verify_token
-from bson import ObjectId
 
-async def get_user_from_token(token: str):
+async def get_identity_from_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Resolve a token to {"user_id", "username", "expires_at"}; the user is only
+    read for legacy tokens issued without the uid claim
+    """
     payload = verify_token(token)
     if not payload or not payload.get("sub"):
         return None
-    
-    user = await user_collection.find_one({"email": payload["sub"]})
-    if user:
-        # The frontend expects 'id' not '_id' for the user object check
-        user['id'] = str(user['_id'])
-    return user
\ No newline at end of file
+
+    if payload.get("uid"):
+        user_id, username = payload["uid"], payload.get("username")
+    else:
+        user = await user_collection.find_one({"email": payload["sub"]}, {"_id": 1, "username": 1})
+        if not user:
+            return None
+        user_id, username = str(user["_id"]), user.get("username")
+
+    return {"user_id": user_id, "username": username or "Unknown", "expires_at": payload.get("exp")}
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+from database import get_database
+from models.payment import PaymentStatus
+from utils.metrics import Histogram, register_metrics
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.getenv("RAZORPAY_WEBHOOK_WORKERS", 2))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("RAZORPAY_WEBHOOK_QUEUE_SIZE", 1000))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("RAZORPAY_WEBHOOK_MAX_ATTEMPTS", 5))
+WEBHOOK_RETRY_BASE_DELAY_SECONDS = float(os.getenv("RAZORPAY_WEBHOOK_RETRY_BASE_DELAY_SECONDS", 0.5))
+
+HANDLED_EVENTS = ("payment.captured", "payment.failed")
+
+def verify_webhook_signature(raw_body: bytes, signature: Optional[str], secret: str) -> bool:
+    """
+    Check X-Razorpay-Signature: hex HMAC-SHA256 of the exact request body
+    """
+    if not signature or not secret:
+        return False
+    expected = hmac.new(secret.encode(), raw_body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+def summarize_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keep only the fields the pipeline acts on, so no card or contact details
+    from the payment entity are stored with the dedup record
+    """
+    payment = ((event.get("payload") or {}).get("payment") or {}).get("entity") or {}
+    return {
+        "event": event.get("event"),
+        "payment_id": payment.get("id"),
+        "order_id": payment.get("order_id"),
+        "amount": payment.get("amount"),
+        "error_code": payment.get("error_code"),
+        "error_description": payment.get("error_description"),
+    }
+
+class WebhookService:
+    """
+    Razorpay webhook pipeline. Deliveries are recorded in webhook_events keyed
+    by event id, which absorbs Razorpay's at-least-once retries, acknowledged
+    straight away and applied to payments and orders by background workers.
+    """
+
+    def __init__(self):
+        from config.razorpay_config import RAZORPAY_CONFIG
+        self.secret = RAZORPAY_CONFIG["WEBHOOK_SECRET"]
+        db = get_database()
+        self.events_collection = db.get_collection("webhook_events")
+        self.payments_collection = db.payments
+        self.orders_collection = db.orders
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.apply_latency = Histogram()
+        self.received = 0
+        self.duplicates = 0
+        self.rejected_signature = 0
+        self.processed = 0
+        self.ignored = 0
+        self.retries = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(WEBHOOK_WORKERS)]
+        try:
+            await self._requeue_unprocessed()
+        except Exception as e:
+            logger.error(f"Could not requeue unprocessed webhook events: {e}")
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def verify(self, raw_body: bytes, signature: Optional[str]) -> None:
+        if not self.secret:
+            logger.error("RAZORPAY_WEBHOOK_SECRET is not set; rejecting webhook")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Webhooks are not configured")
+        if not verify_webhook_signature(raw_body, signature, self.secret):
+            self.rejected_signature += 1
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid webhook signature")
+
+    async def accept(self, event_id: str, event: Dict[str, Any]) -> bool:
+        """
+        Record and enqueue a verified event; returns False for a redelivery
+        """
+        self.received += 1
+        summary = summarize_event(event)
+        try:
+            await self.events_collection.insert_one({
+                "_id": event_id,
+                **summary,
+                "status": "queued",
+                "attempts": 0,
+                "received_at": datetime.utcnow(),
+            })
+        except DuplicateKeyError:
+            self.duplicates += 1
+            return False
+
+        if self._queue is None or self._queue.full():
+            # Forget the delivery so Razorpay's retry is not taken for a duplicate.
+            await self.events_collection.delete_one({"_id": event_id})
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Webhook queue is full",
+                headers={"Retry-After": "5"},
+            )
+        self._queue.put_nowait(event_id)
+        return True
+
+    async def _requeue_unprocessed(self) -> None:
+        cursor = self.events_collection.find({"status": "queued"}, {"_id": 1}).sort("received_at", 1)
+        async for record in cursor:
+            if self._queue.full():
+                break
+            self._queue.put_nowait(record["_id"])
+
+    async def _worker(self) -> None:
+        while True:
+            event_id = await self._queue.get()
+            try:
+                await self._process(event_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook event {event_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, event_id: str) -> None:
+        record = await self.events_collection.find_one({"_id": event_id, "status": "queued"})
+        if not record:
+            return
+
+        if record["event"] not in HANDLED_EVENTS:
+            self.ignored += 1
+            await self._finish(event_id, "ignored", record["attempts"])
+            return
+
+        attempt = record["attempts"]
+        while True:
+            attempt += 1
+            started = asyncio.get_running_loop().time()
+            try:
+                await self._apply(record)
+            except Exception as e:
+                if attempt >= WEBHOOK_MAX_ATTEMPTS:
+                    self.failed += 1
+                    logger.error(f"Webhook {record['event']} {event_id} failed after {attempt} attempts: {e}")
+                    await self._finish(event_id, "failed", attempt, error=str(e))
+                    return
+                self.retries += 1
+                await self.events_collection.update_one({"_id": event_id}, {"$set": {"attempts": attempt}})
+                await asyncio.sleep(random.uniform(0, WEBHOOK_RETRY_BASE_DELAY_SECONDS * (2 ** attempt)))
+                continue
+            finally:
+                self.apply_latency.observe(asyncio.get_running_loop().time() - started)
+
+            self.processed += 1
+            logger.info(f"Applied webhook {record['event']} {event_id}")
+            await self._finish(event_id, "processed", attempt)
+            return
+
+    async def _apply(self, record: Dict[str, Any]) -> None:
+        order_id = record.get("order_id")
+        if not order_id:
+            return
+        now = datetime.utcnow()
+
+        if record["event"] == "payment.captured":
+            await self.payments_collection.update_many(
+                {"order_id": order_id, "status": {"$ne": PaymentStatus.SUCCESS}},
+                {"$set": {
+                    "status": PaymentStatus.SUCCESS,
+                    "razorpay_payment_id": record["payment_id"],
+                    "captured_at": now,
+                    "updated_at": now,
+                }}
+            )
+            await self.orders_collection.update_one(
+                {"order_id": order_id},
+                {"$set": {"status": "paid", "updated_at": now}}
+            )
+        else:
+            # A failed attempt must not undo a capture that was already applied.
+            await self.payments_collection.update_many(
+                {"order_id": order_id, "status": PaymentStatus.PENDING},
+                {"$set": {
+                    "status": PaymentStatus.FAILED,
+                    "razorpay_payment_id": record["payment_id"],
+                    "failure_reason": record.get("error_description") or record.get("error_code"),
+                    "updated_at": now,
+                }}
+            )
+            await self.orders_collection.update_one(
+                {"order_id": order_id, "status": "created"},
+                {"$set": {"status": "attempted", "updated_at": now}}
+            )
+
+    async def _finish(self, event_id: str, final_status: str, attempts: int, error: Optional[str] = None) -> None:
+        update = {"status": final_status, "attempts": attempts, "processed_at": datetime.utcnow()}
+        if error:
+            update["error"] = error
+        await self.events_collection.update_one({"_id": event_id}, {"$set": update})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "rejected_signature": self.rejected_signature,
+            "processed": self.processed,
+            "ignored": self.ignored,
+            "retries": self.retries,
+            "failed": self.failed,
+            "apply_latency_seconds": self.apply_latency.snapshot(),
+        }
+
+webhook_service = WebhookService()
+register_metrics("razorpay_webhooks", webhook_service.stats)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process TTL/LRU cache and single-flight helpers
+"""
+
+import asyncio
+from utils.cache import TTLCache
+from utils.singleflight import SingleFlight
+
+def test_lru_eviction_and_ttl():
+    """Entries are evicted least-recently-used first and expire after their TTL"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+    cache.set("short", 4, ttl=-1)
+    assert cache.get("short") is None
+
+def test_concurrent_misses_share_one_load():
+    """Concurrent misses for one key call the loader once"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_load("k", loader) for _ in range(20)])
+
+    assert asyncio.run(run()) == ["value"] * 20
+    assert len(calls) == 1
+    assert cache.get("k") == "value"
+
+def test_invalidate_during_load_is_not_cached():
+    """A load that races with an invalidation does not repopulate the cache"""
+    cache = TTLCache(maxsize=10, ttl=60)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "stale"
+
+        task = asyncio.ensure_future(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        cache.invalidate("k")
+        release.set()
+        return await task
+
+    assert asyncio.run(run()) == "stale"
+    assert cache.get("k") is None
+
+def test_cancelled_leader_does_not_cancel_followers():
+    """Cancelling the first caller leaves the shared work running for others"""
+    flight = SingleFlight()
+
+    async def run():
+        async def work():
+            await asyncio.sleep(0.01)
+            return 42
+
+        leader = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await follower
+        return leader.cancelled(), result
+
+    assert asyncio.run(run()) == (True, 42)
+    assert flight.stats()["started"] == 1
+    assert flight.stats()["coalesced"] == 1
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-room recent chat message buffer
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from services.chat_service import RecentMessages, serialize_message
+from utils.pagination import decode_cursor
+
+BASE = datetime(2026, 1, 1)
+
+def message(trip_id: str, second: int) -> dict:
+    return {"_id": ObjectId(), "trip_id": trip_id, "user_id": "u", "username": "n", "message": str(second), "timestamp": BASE + timedelta(seconds=second)}
+
+class StoredMessages:
+    """Answers the seeding query over an in-memory list"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = 0
+
+    def find(self, query):
+        self.queries += 1
+        self._matched = [doc for doc in self.docs if doc["trip_id"] == query["trip_id"]]
+        return self
+
+    def sort(self, keys):
+        self._matched.sort(key=lambda doc: (doc["timestamp"], doc["_id"]), reverse=True)
+        return self
+
+    def limit(self, count):
+        self._matched = self._matched[:count]
+        return self
+
+    async def to_list(self, length):
+        return self._matched
+
+def texts(page) -> list:
+    return [item["message"] for item in page.items]
+
+def test_pages_are_served_from_a_seeded_room():
+    """A seeded room answers latest, before and after pages without further queries"""
+    async def run():
+        docs = [message("t", i) for i in range(30)]
+        collection = StoredMessages(docs)
+        recent = RecentMessages(collection, per_room=10, max_bytes=1024 * 1024)
+        assert recent.page("t", 5) is None
+
+        await asyncio.gather(recent.seed("t"), recent.seed("t"))
+        assert collection.queries == 1
+
+        latest = recent.page("t", 5)
+        assert texts(latest) == ["29", "28", "27", "26", "25"]
+        older = recent.page("t", 5, before=decode_cursor(latest.next_cursor))
+        assert texts(older) == ["24", "23", "22", "21", "20"]
+        # The rest is only in Mongo.
+        assert recent.page("t", 5, before=decode_cursor(older.next_cursor)) is None
+
+        sent = message("t", 31)
+        recent.add(sent, serialize_message(sent))
+        recent.add(sent, serialize_message(sent))
+        caught_up = recent.page("t", 5, after=(docs[27]["timestamp"], docs[27]["_id"]))
+        assert texts(caught_up) == ["31", "29", "28"]
+        assert caught_up.next_cursor is None
+        assert recent.page("t", 5, after=(docs[5]["timestamp"], docs[5]["_id"])) is None
+        assert collection.queries == 1
+
+    asyncio.run(run())
+
+def test_rooms_are_evicted_lru_under_the_global_cap():
+    """Adding to one room keeps it warm; the least recently used room goes first"""
+    async def run():
+        collection = StoredMessages([message(trip_id, i) for trip_id in "abc" for i in range(4)])
+        # Room for two rooms of four or five messages, not three
+        recent = RecentMessages(collection, per_room=5, max_bytes=12 * 1024)
+        await recent.seed("a")
+        await recent.seed("b")
+        sent = message("a", 10)
+        recent.add(sent, serialize_message(sent))
+        await recent.seed("c")
+
+        assert recent.page("b", 5) is None
+        assert texts(recent.page("a", 5)) == ["10", "3", "2", "1", "0"]
+        assert texts(recent.page("c", 5)) == ["3", "2", "1", "0"]
+        assert recent.stats()["bytes"] <= 12 * 1024
+        assert recent.stats()["evictions"] == 1
+
+    asyncio.run(run())
+
+def test_empty_rooms_count_toward_the_cap():
+    """Reading history for unknown trips can't grow the buffer without bound"""
+    async def run():
+        recent = RecentMessages(StoredMessages([]), per_room=5, max_bytes=64 * 1024)
+        for i in range(1000):
+            await recent.seed(f"trip_{i}")
+        stats = recent.stats()
+        assert stats["bytes"] <= 64 * 1024
+        assert stats["rooms"] < 1000
+        assert stats["evictions"] == 1000 - stats["rooms"]
+
+    asyncio.run(run())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for the chat write-behind buffer
+"""
+
+import asyncio
+from pymongo.errors import AutoReconnect, BulkWriteError
+from services.chat_service import ChatWriteBuffer
+
+class RecordingCollection:
+    """Stores inserted documents by _id; fails the first `failures` calls"""
+
+    def __init__(self, failures: int = 0):
+        self.docs = {}
+        self.batches = []
+        self.failures = failures
+
+    async def insert_one(self, doc):
+        self.docs[doc["_id"]] = doc
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(len(docs))
+        if self.failures:
+            self.failures -= 1
+            # Half the batch lands before the connection drops.
+            for doc in docs[: len(docs) // 2]:
+                self.docs[doc["_id"]] = doc
+            raise AutoReconnect("connection reset")
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc["_id"] in self.docs:
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.docs[doc["_id"]] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": len(docs) - len(errors)})
+
+def test_messages_are_batched_and_flushed_on_stop():
+    """Full batches go out immediately, the remainder is written by stop()"""
+    async def run():
+        collection = RecordingCollection()
+        buffer = ChatWriteBuffer(collection, batch_size=10, flush_ms=60_000, max_pending=100)
+        await buffer.start()
+        for i in range(10):
+            await buffer.add({"_id": i})
+        await asyncio.sleep(0.01)
+        assert collection.batches == [10]
+        for i in range(10, 15):
+            await buffer.add({"_id": i})
+        await asyncio.sleep(0.01)
+        assert collection.batches == [10]
+        assert buffer.stats()["pending"] == 5
+        await buffer.stop()
+        assert collection.batches == [10, 5]
+        assert sorted(collection.docs) == list(range(15))
+        assert buffer.stats()["pending"] == 0
+
+    asyncio.run(run())
+
+def test_full_buffer_applies_backpressure_and_failed_batches_are_retried():
+    """Writers wait for room, and a partly applied batch is retried without duplicates"""
+    async def run():
+        collection = RecordingCollection(failures=1)
+        buffer = ChatWriteBuffer(collection, batch_size=4, flush_ms=60_000, max_pending=4)
+        await buffer.start()
+        await asyncio.gather(*[buffer.add({"_id": i}) for i in range(12)])
+        await buffer.stop()
+        stats = buffer.stats()
+        assert sorted(collection.docs) == list(range(12))
+        assert stats["written"] == 12
+        assert stats["retried"] == 4
+        assert stats["backpressure_waits"] > 0
+        assert stats["dropped"] == 0
+
+    asyncio.run(run())
+
+def test_senders_blocked_at_shutdown_are_not_lost():
+    """A sender waiting for room when stop() runs still gets its message stored"""
+    async def run():
+        collection = RecordingCollection()
+        buffer = ChatWriteBuffer(collection, batch_size=4, flush_ms=60_000, max_pending=4)
+        await buffer.start()
+        senders = [asyncio.create_task(buffer.add({"_id": i})) for i in range(8)]
+        await asyncio.sleep(0)
+        await buffer.stop()
+        await asyncio.gather(*senders)
+        stats = buffer.stats()
+        assert sorted(collection.docs) == list(range(8))
+        assert stats["pending"] == 0
+        assert stats["written"] == 8
+
+    asyncio.run(run())
+
+def test_messages_being_written_can_still_be_found():
+    """A message is visible to lookups while its batch is in flight"""
+    async def run():
+        release = asyncio.Event()
+
+        class SlowCollection(RecordingCollection):
+            async def insert_many(self, docs, ordered=True):
+                await release.wait()
+                await super().insert_many(docs, ordered)
+
+        collection = SlowCollection()
+        buffer = ChatWriteBuffer(collection, batch_size=2, flush_ms=60_000, max_pending=10)
+        await buffer.start()
+        await buffer.add({"_id": 1, "trip_id": "t"})
+        await buffer.add({"_id": 2, "trip_id": "t"})
+        await asyncio.sleep(0.01)
+        assert buffer.stats()["pending"] == 0
+        assert buffer.pending_message(2) == {"_id": 2, "trip_id": "t"}
+        assert [doc["_id"] for doc in buffer.pending_for_trip("t")] == [1, 2]
+        release.set()
+        await buffer.stop()
+        assert buffer.pending_message(2) is None
+
+    asyncio.run(run())
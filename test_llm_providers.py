@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for the local stub LLM backend and the planner paths it drives
+"""
+
+import asyncio
+import json
+from services import ai_planner_service
+import pytest
+from services.llm_providers import GeminiProvider, LLMProvider, StubProvider
+
+REQUEST = {"destination": "Lisbon, Portugal", "duration_days": 3, "budget": "moderate", "interests": ["food", "music"]}
+PLAN_KEYS = {"title", "destination", "description", "duration_days", "price", "category", "difficulty_level", "image_url", "itinerary"}
+
+def test_stub_returns_deterministic_schema_valid_plan():
+    """The stub answers the planner prompt with a complete plan, the same one every time"""
+    provider = StubProvider(latency_ms=0, tokens_per_sec=0)
+    prompt = ai_planner_service._build_prompt(REQUEST)
+
+    text = asyncio.run(provider.generate(prompt))
+    plan = json.loads(text)
+
+    assert set(plan) == PLAN_KEYS
+    assert plan["destination"] == "Lisbon, Portugal"
+    assert [day["day"] for day in plan["itinerary"]] == [1, 2, 3]
+    assert all(day["title"] and day["activities"] for day in plan["itinerary"])
+    assert asyncio.run(provider.generate(prompt)) == text
+
+    async def streamed():
+        return "".join([piece async for piece in await provider.stream(prompt)])
+
+    assert asyncio.run(streamed()) == text
+
+def test_long_trip_is_merged_from_chunks(monkeypatch):
+    """A trip longer than one chunk comes back with every day, numbered in order"""
+    monkeypatch.setattr(ai_planner_service, "llm_provider", StubProvider(latency_ms=0, tokens_per_sec=0))
+    request = {**REQUEST, "duration_days": ai_planner_service.CHUNK_DAYS * 2 + 3}
+
+    plan = asyncio.run(ai_planner_service._generate_plan(request))
+
+    assert set(plan) == PLAN_KEYS
+    assert plan["duration_days"] == request["duration_days"]
+    assert [day["day"] for day in plan["itinerary"]] == list(range(1, request["duration_days"] + 1))
+
+def test_incomplete_provider_fails_when_created():
+    """A provider missing stream() is rejected up front, not on its first streamed plan"""
+    class GenerateOnly(LLMProvider):
+        async def generate(self, prompt: str) -> str:
+            return "{}"
+
+    with pytest.raises(TypeError):
+        GenerateOnly()
+    GeminiProvider()
+    StubProvider()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tests for LLM admission control: queueing, deadlines, retries and the
+circuit breaker, against a fake upstream
+"""
+
+import asyncio
+from fastapi import HTTPException
+from services.llm_scheduler import LLMScheduler
+
+class Unavailable(Exception):
+    """Stands in for a provider's transient error"""
+
+class FakeUpstream:
+    """Plays back scripted outcomes: a delay in seconds, an exception, or a result"""
+
+    def __init__(self, *outcomes, default="plan"):
+        self.outcomes = list(outcomes)
+        self.default = default
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else self.default
+        if isinstance(outcome, (int, float)):
+            await asyncio.sleep(outcome)
+            return self.default
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def make_scheduler(**overrides) -> LLMScheduler:
+    settings = dict(
+        max_concurrency=1,
+        max_queue=1,
+        queue_timeout=1,
+        call_timeout=1,
+        max_retries=0,
+        retry_base_delay=0.001,
+        retry_max_delay=0.01,
+        breaker_threshold=2,
+        breaker_cooldown=0.05,
+        transient_exceptions=(Unavailable,),
+    )
+    settings.update(overrides)
+    return LLMScheduler(**settings)
+
+async def status_of(awaitable) -> int:
+    try:
+        await awaitable
+    except HTTPException as e:
+        return e.status_code
+    return 200
+
+def test_full_queue_is_rejected_and_queue_wait_is_bounded():
+    """Beyond max_queue waiters the answer is 429; waiting past queue_timeout is 503"""
+    async def run():
+        scheduler = make_scheduler(queue_timeout=0.05)
+        upstream = FakeUpstream(0.2)
+        busy = asyncio.create_task(scheduler.run(upstream))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(status_of(scheduler.run(upstream)))
+        await asyncio.sleep(0.01)
+
+        assert await status_of(scheduler.run(upstream)) == 429
+        assert await queued == 503
+        assert await busy == "plan"
+        stats = scheduler.stats()
+        assert stats["rejected_queue_full"] == 1
+        assert stats["rejected_queue_timeout"] == 1
+        assert upstream.calls == 1
+
+    asyncio.run(run())
+
+def test_call_deadline_answers_504():
+    """A call that outlives call_timeout is abandoned"""
+    async def run():
+        scheduler = make_scheduler(call_timeout=0.02, breaker_threshold=10)
+        assert await status_of(scheduler.run(FakeUpstream(1))) == 504
+        assert scheduler.stats()["timeouts"] == 1
+
+    asyncio.run(run())
+
+def test_transient_errors_are_retried_with_backoff():
+    """Transient errors are retried up to max_retries; other errors are not"""
+    async def run():
+        scheduler = make_scheduler(max_retries=2)
+        upstream = FakeUpstream(Unavailable(), Unavailable(), "plan")
+        assert await scheduler.run(upstream) == "plan"
+        assert upstream.calls == 3
+        assert scheduler.stats()["retries"] == 2
+
+        upstream = FakeUpstream(Unavailable(), Unavailable(), Unavailable(), "plan")
+        assert await status_of(scheduler.run(upstream)) == 503
+        assert upstream.calls == 3
+
+        upstream = FakeUpstream(ValueError("bad request"))
+        try:
+            await scheduler.run(upstream)
+        except ValueError:
+            pass
+        assert upstream.calls == 1
+        assert scheduler.stats()["circuit_state"] == "closed"
+
+    asyncio.run(run())
+
+def test_breaker_opens_probes_and_closes():
+    """Consecutive failures open the breaker; after the cooldown one probe decides"""
+    async def run():
+        scheduler = make_scheduler()
+        upstream = FakeUpstream(Unavailable(), Unavailable())
+        assert await status_of(scheduler.run(upstream)) == 503
+        assert await status_of(scheduler.run(upstream)) == 503
+        assert scheduler.stats()["circuit_state"] == "open"
+
+        # Open: rejected without reaching the upstream
+        assert await status_of(scheduler.run(upstream)) == 503
+        assert upstream.calls == 2
+        assert scheduler.stats()["rejected_circuit_open"] == 1
+
+        # Half-open: a failed probe reopens the breaker
+        await asyncio.sleep(0.06)
+        upstream.outcomes = [Unavailable()]
+        assert await status_of(scheduler.run(upstream)) == 503
+        assert scheduler.stats()["circuit_state"] == "open"
+
+        # Half-open again: only the probe goes through, and its success closes
+        await asyncio.sleep(0.06)
+        upstream.outcomes = [0.02]
+        probe = asyncio.create_task(scheduler.run(upstream))
+        await asyncio.sleep(0.005)
+        assert scheduler.stats()["circuit_state"] == "half_open"
+        assert await status_of(scheduler.run(upstream)) == 503
+        assert await probe == "plan"
+        assert scheduler.stats()["circuit_state"] == "closed"
+        assert await scheduler.run(upstream) == "plan"
+
+    asyncio.run(run())
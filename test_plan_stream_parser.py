@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for the incremental trip plan parser used by the streaming AI endpoint
+"""
+
+import json
+from services.plan_stream_parser import PlanStreamParser
+
+PLAN = {
+    "title": "Art & \"Food\" in Paris {3 days}",
+    "destination": "Paris, France",
+    "description": "Museums, markets, [and] bistros",
+    "duration_days": 2,
+    "price": 900,
+    "category": "City",
+    "difficulty_level": "Easy",
+    "image_url": "https://images.unsplash.com/photo-1",
+    "itinerary": [
+        {"day": 1, "title": "Louvre", "activities": ["Museum", "Seine walk"]},
+        {"day": 2, "title": "Le Marais", "activities": ["Market {brunch}", "Gallery"]},
+    ],
+}
+
+def test_events_arrive_as_values_complete():
+    """Fields and itinerary days are reported as soon as they are complete, in order"""
+    text = "```json\n" + json.dumps(PLAN, indent=2) + "\n```"
+    parser = PlanStreamParser()
+    events = []
+    for i in range(0, len(text), 7):
+        events.extend(parser.feed(text[i:i + 7]))
+
+    assert parser.done
+    assert parser.result() == PLAN
+
+    fields = [e[1] for e in events if e[0] == "field"]
+    assert fields == list(PLAN.keys())
+    assert [e[1] for e in events if e[0] == "item"] == PLAN["itinerary"]
+
+    first_day = next(i for i, e in enumerate(events) if e[0] == "item")
+    itinerary_done = next(i for i, e in enumerate(events) if e[:2] == ("field", "itinerary"))
+    assert first_day < itinerary_done
+    assert events[:2] == [("begin", "title"), ("field", "title", PLAN["title"])]
+
+def test_incomplete_stream_has_no_result():
+    """A truncated object is reported as incomplete rather than parsed"""
+    parser = PlanStreamParser()
+    parser.feed(json.dumps(PLAN)[:-20])
+    assert not parser.done
+    try:
+        parser.result()
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for Razorpay webhook signature checks and event summaries
+"""
+
+import hashlib
+import hmac
+import json
+from services.webhook_service import summarize_event, verify_webhook_signature
+
+EVENT = {
+    "entity": "event",
+    "event": "payment.failed",
+    "payload": {
+        "payment": {
+            "entity": {
+                "id": "pay_123",
+                "order_id": "order_456",
+                "amount": 150000,
+                "email": "traveller@example.com",
+                "contact": "+919876543210",
+                "error_code": "BAD_REQUEST_ERROR",
+                "error_description": "Payment declined by bank",
+            }
+        }
+    },
+}
+
+def test_signature_is_checked_against_the_raw_body():
+    """Only the exact bytes Razorpay signed are accepted"""
+    body = json.dumps(EVENT).encode()
+    signature = hmac.new(b"webhook-secret", body, hashlib.sha256).hexdigest()
+
+    assert verify_webhook_signature(body, signature, "webhook-secret")
+    assert not verify_webhook_signature(json.dumps(EVENT, indent=2).encode(), signature, "webhook-secret")
+    assert not verify_webhook_signature(body, signature, "other-secret")
+    assert not verify_webhook_signature(body, None, "webhook-secret")
+    assert not verify_webhook_signature(body, signature, "")
+
+def test_summary_keeps_only_what_the_pipeline_needs():
+    """Contact details from the payment entity are not carried into the dedup record"""
+    summary = summarize_event(EVENT)
+
+    assert summary == {
+        "event": "payment.failed",
+        "payment_id": "pay_123",
+        "order_id": "order_456",
+        "amount": 150000,
+        "error_code": "BAD_REQUEST_ERROR",
+        "error_description": "Payment declined by bank",
+    }
+    assert summarize_event({"event": "order.paid"})["order_id"] is None
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from bson import ObjectId
+
+def encode_cursor(sort_value: datetime, doc_id: Any) -> str:
+    """
+    Encode a (sort_value, _id) keyset position as an opaque URL-safe cursor
+    """
+    raw = json.dumps({"t": sort_value.isoformat(), "id": str(doc_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Decode a cursor produced by encode_cursor, raising ValueError if it is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        sort_value = datetime.fromisoformat(data["t"])
+        doc_id = data["id"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    if not ObjectId.is_valid(doc_id):
+        raise ValueError("Invalid cursor")
+    return sort_value, ObjectId(doc_id)
+
+def keyset_filter(field: str, cursor: str, descending: bool = True) -> Dict[str, Any]:
+    """
+    Build the filter selecting documents strictly after the cursor position
+    for a sort on (field, _id) in the given direction
+    """
+    sort_value, doc_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {
+        "$or": [
+            {field: {op: sort_value}},
+            {field: sort_value, "_id": {op: doc_id}},
+        ]
+    }
+
+def merge_filters(query: Dict[str, Any], extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    AND an extra filter onto a query without clobbering keys such as $or
+    """
+    if not extra:
+        return query
+    if not query:
+        return extra
+    return {"$and": [query, extra]}
+
+def next_cursor_for(docs: list, limit: int, field: str) -> Optional[str]:
+    """
+    Return the cursor for the page after docs, which should have been fetched
+    with limit + 1 so that the presence of a further page can be detected
+    """
+    if len(docs) <= limit:
+        return None
+    last = docs[limit - 1]
+    return encode_cursor(last[field], last["_id"])